@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Analysis
+
+
+@admin.register(Analysis)
+class AnalysisAdmin(admin.ModelAdmin):
+    list_display = ("id", "source", "status", "document_hash", "created_at")
+    list_filter = ("status",)
+    search_fields = ("source", "document_hash")
+    readonly_fields = ("created_at",)
@@ -0,0 +1,200 @@
+"""
+Compact on-disk format for cached document artifacts.
+
+An artifact file is an 8-byte magic, a little-endian u32 header length, a JSON
+header describing each section, then the sections, each aligned to 64 bytes:
+
+- ``texts``: strings concatenated as UTF-8, with ``text_offsets`` (uint64,
+  n + 1 entries) marking where each one starts and ends
+- named numeric arrays (e.g. float16 embeddings), stored contiguously
+- named structured sections (metadata, answers) encoded with msgpack, or JSON
+  when msgpack isn't installed
+
+Structured sections and the text buffer can be zstd-compressed. Arrays and
+offsets are never compressed, so readers get them as numpy views over an mmap
+of the file without copying.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # JSON fallback; msgpack is listed in requirements.txt
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"PFMART1\0"
+ALIGN = 64
+EXTENSION = ".pfa"
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def _encode(value, compress):
+    if msgpack is not None:
+        codec, data = "msgpack", msgpack.packb(value, use_bin_type=True)
+    else:
+        codec, data = "json", json.dumps(value).encode()
+    if compress:
+        codec, data = f"{codec}+zstd", zstandard.ZstdCompressor(level=3).compress(data)
+    return codec, data
+
+
+def _decode(codec, data):
+    if codec.endswith("+zstd"):
+        if zstandard is None:
+            raise ArtifactError("Artifact is zstd-compressed but zstandard is not installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+        codec = codec[:-len("+zstd")]
+    if codec == "msgpack":
+        if msgpack is None:
+            raise ArtifactError("Artifact uses msgpack but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False)
+    if codec == "json":
+        return json.loads(bytes(data))
+    raise ArtifactError(f"Unknown artifact codec: {codec}")
+
+
+def write_artifact(path, texts, arrays=None, sections=None, meta=None, compress=False):
+    """Write texts, numeric arrays and structured sections to ``path`` atomically."""
+    compress = compress and zstandard is not None
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    text_buffer = b"".join(encoded)
+    text_codec = "raw"
+    if compress:
+        text_codec, text_buffer = "zstd", zstandard.ZstdCompressor(level=3).compress(text_buffer)
+
+    payloads = [
+        ("text_offsets", {"codec": "raw", "dtype": "<u8", "shape": list(offsets.shape)}, offsets.tobytes()),
+        ("texts", {"codec": text_codec}, text_buffer),
+    ]
+    for name, array in (arrays or {}).items():
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        payloads.append((name, {"codec": "raw", "dtype": array.dtype.str, "shape": list(array.shape)}, array.tobytes()))
+    for name, value in (sections or {}).items():
+        codec, data = _encode(value, compress)
+        payloads.append((name, {"codec": codec}, data))
+
+    # Lay out sections after the header; the header's own length depends on the offsets it records
+    header = {"meta": meta or {}, "sections": {}}
+    start = None
+    while True:
+        header_bytes = json.dumps(header).encode()
+        if start == _align(len(MAGIC) + 4 + len(header_bytes)):
+            break
+        start = position = _align(len(MAGIC) + 4 + len(header_bytes))
+        for name, info, data in payloads:
+            header["sections"][name] = {**info, "offset": position, "length": len(data)}
+            position = _align(position + len(data))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False, suffix=".tmp") as tmp:
+        tmp.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for name, _, data in payloads:
+            tmp.write(b"\0" * (header["sections"][name]["offset"] - tmp.tell()))
+            tmp.write(data)
+    os.replace(tmp.name, path)
+    return path.stat().st_size
+
+
+def _align(position):
+    return (position + ALIGN - 1) // ALIGN * ALIGN
+
+
+class Artifact:
+    """Read-only view of an artifact file backed by mmap."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._texts = None
+        with open(self.path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise ArtifactError(f"{self.path} is not an artifact file: {e}") from e
+        try:
+            if self._mmap[:len(MAGIC)] != MAGIC:
+                raise ArtifactError("bad magic")
+            (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+            start = len(MAGIC) + 4
+            header = json.loads(self._mmap[start:start + header_length])
+            self.meta = header["meta"]
+            self.sections = header["sections"]
+            for info in self.sections.values():
+                if info["offset"] + info["length"] > len(self._mmap):
+                    raise ArtifactError("truncated")
+        except (ArtifactError, struct.error, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.close()
+            raise ArtifactError(f"{self.path} is not an artifact file: {e}") from e
+
+    def close(self):
+        if isinstance(self._texts, memoryview):
+            self._texts.release()
+        self._texts = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _raw(self, name):
+        info = self.sections[name]
+        return memoryview(self._mmap)[info["offset"]:info["offset"] + info["length"]]
+
+    def _array(self, name):
+        info = self.sections[name]
+        return np.frombuffer(self._mmap, dtype=info["dtype"], count=int(np.prod(info["shape"])),
+                             offset=info["offset"]).reshape(info["shape"])
+
+    def __len__(self):
+        return self.sections["text_offsets"]["shape"][0] - 1
+
+    def array(self, name):
+        """Numeric array viewing the mapped file; copy or cast it before closing the artifact."""
+        return self._array(name)
+
+    def text(self, i):
+        offsets = self._array("text_offsets")
+        if self._texts is None:
+            if self.sections["texts"]["codec"] == "zstd" and zstandard is None:
+                raise ArtifactError("Artifact is zstd-compressed but zstandard is not installed")
+            try:
+                self._texts = (
+                    self._raw("texts") if self.sections["texts"]["codec"] == "raw"
+                    else memoryview(zstandard.ZstdDecompressor().decompress(bytes(self._raw("texts"))))
+                )
+            except zstandard.ZstdError as e:
+                raise ArtifactError(f"Texts of {self.path} are corrupt: {e}") from e
+        return bytes(self._texts[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def texts(self):
+        return [self.text(i) for i in range(len(self))]
+
+    def section(self, name, default=None):
+        if name not in self.sections:
+            return default
+        try:
+            return _decode(self.sections[name]["codec"], self._raw(name))
+        except ArtifactError:
+            raise
+        except Exception as e:
+            raise ArtifactError(f"Section {name} of {self.path} is corrupt: {e}") from e
@@ -0,0 +1,288 @@
+import json
+import time
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ChainEvent, ChainIndexerState, ChainProposal, ChainStage, ChainVote
+
+# topic0 (keccak256 of the event signature) -> (event name, argument names, argument types)
+# None of the PublicFundManagement event parameters are indexed, so every argument is in the log data.
+EVENTS = {
+    "0x3417b456fad6209c73445d5efd446d686e75e4560f0f50c13b5a5cde976447b4":
+        ("ProposalCreated", ["proposalId", "creator", "amount"], ["uint256", "address", "uint256"]),
+    "0xf4f47ab4c9704ad0b8a14c36d717df9bdab02b03ba2c3881025df68065359d96":
+        ("AuthorityVoted", ["proposalId", "authority", "vote"], ["uint256", "address", "bool"]),
+    "0x5f4af5e0d7a7054fdfc57fdb4228e62d03197caefb522d444851b7f4aa4a3131":
+        ("PublicVotingStarted", ["proposalId", "endTime"], ["uint256", "uint256"]),
+    "0xdc8ea6e037883d99840ce13630976c2f8be46865246ec8c1e51412e799167afd":
+        ("PublicVoted", ["proposalId", "voter", "vote", "comment"], ["uint256", "address", "bool", "string"]),
+    "0x28ec9e38ba73636ceb2f6c1574136f83bd46284a3c74734b711bf45e12f8d929":
+        ("ProposalApproved", ["proposalId"], ["uint256"]),
+    "0xd92fba445edb3153b571e6df782d7a66fd0ce668519273670820ee3a86da0ef4":
+        ("ProposalRejected", ["proposalId"], ["uint256"]),
+    "0x9173fb234e551ec64fd31fc796dabefe0227f212a2400354316bc9c53401d798":
+        ("StageAmountReleased", ["proposalId", "stageNumber", "amount"], ["uint256", "uint256", "uint256"]),
+    "0x7c4e662913d640923d610d1927bd118bad29e43f2346c6b821162651960b7243":
+        ("StageReportSubmitted", ["proposalId", "stageNumber", "report"], ["uint256", "uint256", "string"]),
+    "0x0f04330b3bf960d6c4dd4f95e66af3bfa666772f11151f59c977cfb45e66fd9a":
+        ("StageApproved", ["proposalId", "stageNumber"], ["uint256", "uint256"]),
+    "0x38ca9a0cef5bad2d3e13b8a99a6077611bcf4631f4ddb0ae733a751179169c11":
+        ("StageCompleted", ["proposalId", "stageNumber"], ["uint256", "uint256"]),
+    "0x71611adb0c8d2eea43359b2e41e5fdf96309ce734ed1eb78ceb763198c1b8967":
+        ("ProposalCompleted", ["proposalId"], ["uint256"]),
+}
+
+# Function selectors used once per new proposal to fetch fields that events do not carry
+GET_PROPOSAL_INFO = "0xbc903cb8"  # getProposalInfo(uint256)
+GET_STAGE_INFO = "0xe851ed71"  # getStageInfo(uint256,uint256)
+PROPOSAL_INFO_TYPES = ["string", "address", "uint256", "uint8"] + ["uint256"] * 7
+STAGE_INFO_TYPES = ["uint256", "string", "string", "uint256", "uint8"]
+
+PROPOSAL_STATE = {"UnderAuthorityVoting": 1, "PublicVoting": 2, "Approved": 3, "Rejected": 4, "InProgress": 5, "Completed": 6}
+STAGE_STATE = {"InProgress": 1, "Completed": 2}
+
+
+def decode_abi(types, data):
+    """Decode ABI-encoded values of the static and string types used by the contract."""
+    raw = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+    values = []
+    for i, abi_type in enumerate(types):
+        word = raw[i * 32:(i + 1) * 32]
+        if abi_type == "address":
+            values.append("0x" + word[12:].hex())
+        elif abi_type == "bool":
+            values.append(int.from_bytes(word, "big") != 0)
+        elif abi_type == "string":
+            offset = int.from_bytes(word, "big")
+            length = int.from_bytes(raw[offset:offset + 32], "big")
+            values.append(raw[offset + 32:offset + 32 + length].decode("utf-8", errors="replace"))
+        else:
+            values.append(int.from_bytes(word, "big"))
+    return values
+
+
+def encode_uints(*values):
+    return "".join(f"{value:064x}" for value in values)
+
+
+def default_contract_address():
+    """Contract address from settings, falling back to the hardhat deployment record."""
+    address = getattr(settings, "CHAIN_CONTRACT_ADDRESS", None)
+    if address:
+        return address
+    try:
+        with open(settings.BASE_DIR.parent / "smart-contracts" / "deployments.json") as f:
+            return json.load(f)["PublicFundManagement"]
+    except (OSError, KeyError, ValueError):
+        raise ValueError("Set CHAIN_CONTRACT_ADDRESS to the PublicFundManagement contract address")
+
+
+class JsonRpcClient:
+    """Minimal Ethereum JSON-RPC client."""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.request_id = 0
+
+    def call(self, method, params):
+        self.request_id += 1
+        response = self.session.post(
+            self.url,
+            json={"jsonrpc": "2.0", "id": self.request_id, "method": method, "params": params},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if "error" in payload:
+            raise RuntimeError(f"RPC {method} failed: {payload['error']}")
+        return payload["result"]
+
+    def block_number(self):
+        return int(self.call("eth_blockNumber", []), 16)
+
+    def get_logs(self, address, from_block, to_block):
+        return self.call("eth_getLogs", [{
+            "address": address,
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+            "topics": [list(EVENTS)],
+        }])
+
+    def eth_call(self, address, data, block="latest"):
+        return self.call("eth_call", [{"to": address, "data": data}, block])
+
+
+class ChainIndexer:
+    """
+    Incrementally ingests PublicFundManagement events into the Chain* tables.
+
+    Each block range is applied in one transaction together with the cursor
+    update, and events are keyed by (tx_hash, log_index), so re-running over
+    the same range is harmless.
+    """
+
+    def __init__(self, rpc_url=None, contract_address=None, batch_size=None, confirmations=None):
+        self.rpc = JsonRpcClient(rpc_url or getattr(settings, "CHAIN_RPC_URL", "http://127.0.0.1:8545"))
+        self.address = (contract_address or default_contract_address()).lower()
+        self.batch_size = batch_size or getattr(settings, "CHAIN_BATCH_SIZE", 2000)
+        self.confirmations = confirmations if confirmations is not None else getattr(settings, "CHAIN_CONFIRMATIONS", 0)
+
+    def sync(self, max_batches=None):
+        """Ingest new events up to the confirmed head; returns the number of events applied."""
+        state, _ = ChainIndexerState.objects.get_or_create(
+            contract_address=self.address,
+            defaults={"last_block": getattr(settings, "CHAIN_START_BLOCK", 0) - 1},
+        )
+        head = self.rpc.block_number() - self.confirmations
+        applied = batches = 0
+        while state.last_block < head and (max_batches is None or batches < max_batches):
+            from_block = state.last_block + 1
+            to_block = min(head, from_block + self.batch_size - 1)
+            logs = self.rpc.get_logs(self.address, from_block, to_block)
+            with transaction.atomic():
+                for log in sorted(logs, key=lambda l: (int(l["blockNumber"], 16), int(l["logIndex"], 16))):
+                    applied += self.apply_log(log, to_block)
+                state.last_block = to_block
+                state.save(update_fields=["last_block", "updated_at"])
+            batches += 1
+            print(f"Indexed blocks {from_block}-{to_block}: {len(logs)} events")
+        return applied
+
+    def follow(self, interval=2.0):
+        """Keep syncing new blocks until interrupted."""
+        while True:
+            self.sync()
+            time.sleep(interval)
+
+    def apply_log(self, log, to_block):
+        topic = log["topics"][0].lower() if log.get("topics") else None
+        if topic not in EVENTS:
+            return 0
+        name, arg_names, arg_types = EVENTS[topic]
+        args = dict(zip(arg_names, decode_abi(arg_types, log["data"])))
+        block_number = int(log["blockNumber"], 16)
+        try:
+            with transaction.atomic():
+                ChainEvent.objects.create(
+                    block_number=block_number,
+                    tx_hash=log["transactionHash"],
+                    log_index=int(log["logIndex"], 16),
+                    name=name,
+                    proposal_id=args.get("proposalId"),
+                    args={key: str(value) if isinstance(value, int) and not isinstance(value, bool) else value
+                          for key, value in args.items()},
+                )
+        except IntegrityError:
+            return 0  # already ingested
+
+        getattr(self, f"on_{name}")(args, block_number, to_block)
+        return 1
+
+    # Event handlers fold each event into the proposal/stage/vote tables
+
+    def _proposal(self, args, block_number):
+        proposal = ChainProposal.objects.select_for_update().get(proposal_id=args["proposalId"])
+        proposal.updated_block = block_number
+        return proposal
+
+    def _set_state(self, args, block_number, state):
+        ChainProposal.objects.filter(proposal_id=args["proposalId"]).update(state=state, updated_block=block_number)
+
+    def _stage(self, args, stage_number=None):
+        stage, _ = ChainStage.objects.get_or_create(
+            proposal=ChainProposal.objects.get(proposal_id=args["proposalId"]),
+            stage_number=args["stageNumber"] if stage_number is None else stage_number,
+        )
+        return stage
+
+    def on_ProposalCreated(self, args, block_number, to_block):
+        proposal_id = args["proposalId"]
+        # Description, recipient and stage amounts are not in the event; read them once at the batch end block
+        info = decode_abi(PROPOSAL_INFO_TYPES, self.rpc.eth_call(
+            self.address, GET_PROPOSAL_INFO + encode_uints(proposal_id), hex(to_block)))
+        description, recipient, _, _, _, _, _, total_stages = info[:8]
+        proposal, _ = ChainProposal.objects.update_or_create(
+            proposal_id=proposal_id,
+            defaults={
+                "creator": args["creator"],
+                "recipient": recipient,
+                "description": description,
+                "total_amount": args["amount"],
+                "state": PROPOSAL_STATE["UnderAuthorityVoting"],
+                "total_stages": total_stages,
+                "created_block": block_number,
+                "updated_block": block_number,
+            },
+        )
+        for stage_number in range(total_stages):
+            amount = decode_abi(STAGE_INFO_TYPES, self.rpc.eth_call(
+                self.address, GET_STAGE_INFO + encode_uints(proposal_id, stage_number), hex(to_block)))[0]
+            ChainStage.objects.update_or_create(
+                proposal=proposal, stage_number=stage_number, defaults={"amount": amount}
+            )
+
+    def on_AuthorityVoted(self, args, block_number, to_block):
+        proposal = self._proposal(args, block_number)
+        field = "authority_yes_votes" if args["vote"] else "authority_no_votes"
+        setattr(proposal, field, F(field) + 1)
+        proposal.save()
+        ChainVote.objects.create(proposal=proposal, kind="authority", voter=args["authority"],
+                                 vote=args["vote"], block_number=block_number)
+
+    def on_PublicVotingStarted(self, args, block_number, to_block):
+        ChainProposal.objects.filter(proposal_id=args["proposalId"]).update(
+            state=PROPOSAL_STATE["PublicVoting"], public_voting_end_time=args["endTime"], updated_block=block_number)
+
+    def on_PublicVoted(self, args, block_number, to_block):
+        proposal = self._proposal(args, block_number)
+        field = "public_yes_votes" if args["vote"] else "public_no_votes"
+        setattr(proposal, field, F(field) + 1)
+        proposal.save()
+        ChainVote.objects.create(proposal=proposal, kind="public", voter=args["voter"], vote=args["vote"],
+                                 comment=args["comment"], block_number=block_number)
+
+    def on_ProposalApproved(self, args, block_number, to_block):
+        self._set_state(args, block_number, PROPOSAL_STATE["Approved"])
+
+    def on_ProposalRejected(self, args, block_number, to_block):
+        self._set_state(args, block_number, PROPOSAL_STATE["Rejected"])
+
+    def on_StageAmountReleased(self, args, block_number, to_block):
+        ChainProposal.objects.filter(proposal_id=args["proposalId"]).update(
+            state=PROPOSAL_STATE["InProgress"], current_stage=args["stageNumber"] + 1, updated_block=block_number)
+        stage = self._stage(args)
+        stage.state = STAGE_STATE["InProgress"]
+        stage.released_amount = args["amount"]
+        stage.save()
+
+    def on_StageReportSubmitted(self, args, block_number, to_block):
+        stage = self._stage(args)
+        stage.report = args["report"]
+        stage.save(update_fields=["report"])
+
+    def on_StageApproved(self, args, block_number, to_block):
+        stage = self._stage(args)
+        stage.state = STAGE_STATE["Completed"]
+        stage.save(update_fields=["state"])
+        ChainProposal.objects.filter(proposal_id=args["proposalId"]).update(updated_block=block_number)
+
+    def on_StageCompleted(self, args, block_number, to_block):
+        self.on_StageApproved(args, block_number, to_block)
+        # ProposalStageCompleted releases the next stage's funds without a StageAmountReleased event
+        proposal = ChainProposal.objects.get(proposal_id=args["proposalId"])
+        next_stage = args["stageNumber"] + 1
+        if next_stage < proposal.total_stages:
+            stage = self._stage(args, next_stage)
+            stage.state = STAGE_STATE["InProgress"]
+            stage.released_amount = stage.amount
+            stage.save(update_fields=["state", "released_amount"])
+            proposal.current_stage = next_stage
+            proposal.save(update_fields=["current_stage"])
+
+    def on_ProposalCompleted(self, args, block_number, to_block):
+        self._set_state(args, block_number, PROPOSAL_STATE["Completed"])
@@ -0,0 +1,291 @@
+import json
+import os
+import threading
+import time
+from math import sqrt
+from pathlib import Path
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from filelock import FileLock
+
+from .models import CorpusChunk
+
+# Corpus size (in chunks) from which the index switches from HNSW to IVF-PQ
+IVF_PQ_MIN_VECTORS = getattr(settings, "CORPUS_IVF_PQ_MIN_VECTORS", 100_000)
+# Rebuild an HNSW index once this fraction of its vectors belongs to deleted documents
+TOMBSTONE_REBUILD_RATIO = 0.25
+
+# Chunks added by this process between snapshots of the index file
+SNAPSHOT_EVERY = 1000
+# Ids this far below the newest indexed id are re-checked every SYNC_RESCAN_SECONDS
+# and on writes, so chunks whose transactions committed out of id order are still
+# picked up; searches in between only look for ids above the newest indexed one
+SYNC_OVERLAP = 10_000
+SYNC_RESCAN_SECONDS = 30
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+
+
+def _normalize(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _pq_subquantizers(dim):
+    for m in (48, 32, 24, 16, 8, 4):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+class CorpusIndex:
+    """
+    Persistent approximate-nearest-neighbour index over every analyzed document.
+
+    Chunk texts and vectors live in the ``CorpusChunk`` table, whose primary keys
+    are the FAISS ids; the table is the source of truth shared by all workers.
+    Each process keeps the FAISS index in memory and catches up with chunks
+    other processes committed by reading only rows it hasn't indexed yet. HNSW
+    is used for small corpora (deletes are tombstoned and filtered against the
+    table), IVF-PQ once the corpus reaches ``IVF_PQ_MIN_VECTORS`` chunks.
+
+    The index file next to the database is only a snapshot that spares a new
+    process the full rebuild. It is written every ``SNAPSHOT_EVERY`` added
+    chunks and after rebuilds, under a cross-process file lock and via a
+    temporary file, so workers never interleave writes or read half a file.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or getattr(settings, "CORPUS_INDEX_DIR", settings.BASE_DIR / "corpus_index"))
+        self.path = self.directory / "corpus.faiss"
+        self.meta_path = self.directory / "corpus.json"
+        self.lock = threading.RLock()
+        self.index = None
+        self.synced_id = 0  # newest chunk id in the index
+        self.recent_ids = set()  # indexed ids within SYNC_OVERLAP of synced_id
+        self.unsaved = 0
+        self.rescanned_at = None
+
+    # Index lifecycle
+
+    def _kind(self, index=None):
+        index = faiss.downcast_index(self.index if index is None else index)
+        return "ivfpq" if isinstance(index, faiss.IndexIVF) else "hnsw"
+
+    def _configure(self):
+        if self._kind() == "ivfpq":
+            faiss.extract_index_ivf(self.index).nprobe = IVF_NPROBE
+        else:
+            faiss.downcast_index(faiss.downcast_index(self.index).index).hnsw.efSearch = HNSW_EF_SEARCH
+
+    def _file_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return FileLock(str(self.directory / "corpus.lock"))
+
+    def _ensure_loaded(self, rescan=False):
+        if self.index is None:
+            with self._file_lock():
+                if self.path.exists() and self.meta_path.exists():
+                    meta = json.loads(self.meta_path.read_text())
+                    self.index = faiss.read_index(str(self.path))
+                    self.synced_id, self.recent_ids = meta["synced_id"], set(meta["recent_ids"])
+                    self._configure()
+            if self.index is None:
+                self._rebuild()
+                return
+        self._sync(rescan)
+
+    def _mark_indexed(self, ids):
+        if not ids:
+            return
+        self.synced_id = max(self.synced_id, max(ids))
+        floor = self.synced_id - SYNC_OVERLAP
+        self.recent_ids = {i for i in self.recent_ids if i > floor} | {i for i in ids if i > floor}
+
+    def _sync(self, rescan=False):
+        """Index chunks that any process committed since this process last looked.
+
+        Only ids above ``synced_id`` are queried, unless ``rescan`` is set or
+        SYNC_RESCAN_SECONDS have passed; then the overlap window below it is
+        re-checked for chunks that committed late.
+        """
+        now = time.monotonic()
+        if rescan or self.rescanned_at is None or now - self.rescanned_at >= SYNC_RESCAN_SECONDS:
+            self.rescanned_at = now
+            floor = max(self.synced_id - SYNC_OVERLAP, 0)
+            candidates = CorpusChunk.objects.filter(id__gt=floor).values_list("id", flat=True)
+            missing = [i for i in candidates if i > self.synced_id or i not in self.recent_ids]
+            if not missing:
+                return
+            rows = CorpusChunk.objects.filter(id__in=missing)
+        else:
+            rows = CorpusChunk.objects.filter(id__gt=self.synced_id)
+        rows = list(rows.order_by("id").values_list("id", "embedding"))
+        ids = [row[0] for row in rows]
+        if ids:
+            vectors = np.vstack([np.frombuffer(bytes(row[1]), dtype="float32") for row in rows])
+            self.index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+            self._mark_indexed(ids)
+            self.unsaved += len(ids)
+        if self.unsaved >= SNAPSHOT_EVERY:
+            self._save()
+
+    def _save(self):
+        with self._file_lock():
+            tmp_path = self.path.with_suffix(".tmp")
+            faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, self.path)
+            tmp_meta = self.meta_path.with_suffix(".json.tmp")
+            tmp_meta.write_text(json.dumps({"synced_id": self.synced_id, "recent_ids": sorted(self.recent_ids)}))
+            os.replace(tmp_meta, self.meta_path)
+        self.unsaved = 0
+
+    def _build(self, ids, vectors, dim):
+        if len(ids) >= IVF_PQ_MIN_VECTORS:
+            nlist = int(4 * sqrt(len(ids)))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8, faiss.METRIC_INNER_PRODUCT)
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+            index.train(sample)
+        else:
+            hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index = faiss.IndexIDMap2(hnsw)
+        if len(ids):
+            index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+        return index
+
+    def _rebuild(self, dim=None):
+        """Rebuild the index from the corpus table, picking the index type for its size."""
+        rows = list(CorpusChunk.objects.order_by("id").values_list("id", "embedding"))
+        if rows:
+            ids = [row[0] for row in rows]
+            vectors = np.vstack([np.frombuffer(bytes(row[1]), dtype="float32") for row in rows])
+            dim = vectors.shape[1]
+        elif dim is None:
+            self.index = None
+            return
+        else:
+            ids, vectors = [], np.zeros((0, dim), dtype="float32")
+        self.index = self._build(ids, vectors, dim)
+        self.synced_id, self.recent_ids = 0, set()
+        self.rescanned_at = time.monotonic()
+        self._mark_indexed(ids)
+        self._configure()
+        self._save()
+        print(f"Corpus index rebuilt: {len(ids)} chunks ({self._kind()})")
+
+    def _needs_rebuild(self, live_count):
+        kind = self._kind()
+        if (kind == "hnsw") != (live_count < IVF_PQ_MIN_VECTORS):
+            return True
+        return kind == "hnsw" and self.index.ntotal > live_count * (1 + TOMBSTONE_REBUILD_RATIO)
+
+    # Public API
+
+    def add_vector_store(self, document_hash, source, vector_store, k=5):
+        """Add the chunks of a per-request FAISS store and return similar earlier documents."""
+        n = vector_store.index.ntotal
+        if not n:
+            return []
+        vectors = _normalize(vector_store.index.reconstruct_n(0, n))
+        texts = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+            for i in range(n)
+        ]
+        similar = self.search(vectors, k=k, exclude_hash=document_hash)
+        self.add(document_hash, source, texts, vectors)
+        return similar
+
+    def add(self, document_hash, source, texts, vectors):
+        """Add a document's chunks to the corpus; documents already present are skipped."""
+        vectors = _normalize(vectors)
+        with self.lock:
+            if CorpusChunk.objects.filter(document_hash=document_hash).exists():
+                return 0
+            with transaction.atomic():
+                CorpusChunk.objects.bulk_create([
+                    CorpusChunk(
+                        document_hash=document_hash,
+                        source=(source or "")[:255],
+                        chunk_index=i,
+                        text=text,
+                        embedding=vectors[i].tobytes(),
+                    )
+                    for i, text in enumerate(texts)
+                ])
+            # Picks up the new rows together with any other worker's
+            self._ensure_loaded(rescan=True)
+            if self.index is None or self._needs_rebuild(CorpusChunk.objects.count()):
+                self._rebuild(dim=vectors.shape[1])
+            return len(texts)
+
+    def remove_document(self, document_hash):
+        """Remove a document's chunks from the corpus; returns the number removed."""
+        with self.lock:
+            ids = list(CorpusChunk.objects.filter(document_hash=document_hash).values_list("id", flat=True))
+            if not ids:
+                return 0
+            CorpusChunk.objects.filter(id__in=ids).delete()
+            self._ensure_loaded(rescan=True)
+            if self.index is None:
+                return len(ids)
+            if self._kind() == "ivfpq":
+                self.index.remove_ids(np.asarray(ids, dtype="int64"))
+            # Other workers filter the removed ids against the table until they rebuild
+            if self._needs_rebuild(CorpusChunk.objects.count()):
+                self._rebuild(dim=self.index.d)
+            return len(ids)
+
+    def search(self, vectors, k=5, exclude_hash=None):
+        """Return up to ``k`` documents most similar to the query vectors, best first."""
+        vectors = _normalize(np.atleast_2d(vectors))
+        with self.lock:
+            self._ensure_loaded()
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            # Over-fetch to leave room for tombstoned and excluded chunks
+            scores, ids = self.index.search(vectors, min(self.index.ntotal, k * 8))
+
+        best = {}
+        for score, chunk_id in zip(scores.ravel(), ids.ravel()):
+            if chunk_id >= 0 and score > best.get(chunk_id, -np.inf):
+                best[int(chunk_id)] = float(score)
+        rows = CorpusChunk.objects.filter(id__in=best.keys()).values("id", "document_hash", "source", "text")
+
+        documents = {}
+        for row in rows:
+            if row["document_hash"] == exclude_hash:
+                continue
+            score = best[row["id"]]
+            doc = documents.setdefault(row["document_hash"], {
+                "document_hash": row["document_hash"],
+                "source": row["source"],
+                "score": score,
+                "matched_chunks": 0,
+                "excerpt": row["text"][:300],
+            })
+            doc["matched_chunks"] += 1
+            if score > doc["score"]:
+                doc["score"], doc["excerpt"] = score, row["text"][:300]
+        return sorted(documents.values(), key=lambda d: d["score"], reverse=True)[:k]
+
+    def stats(self):
+        with self.lock:
+            self._ensure_loaded()
+            return {
+                "documents": CorpusChunk.objects.values("document_hash").distinct().count(),
+                "chunks": CorpusChunk.objects.count(),
+                "index_type": self._kind() if self.index is not None else None,
+                "indexed_vectors": self.index.ntotal if self.index is not None else 0,
+            }
+
+
+corpus_index = CorpusIndex()
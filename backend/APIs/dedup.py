@@ -0,0 +1,141 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .models import Analysis, DocumentSignature
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # 16 bands x 8 rows: candidates from roughly 0.7 Jaccard upwards
+SHINGLE_SIZE = 5
+# Texts with fewer shingles (e.g. scanned PDFs without a text layer) get no signature
+MIN_SHINGLES = 20
+_PRIME = (1 << 31) - 1
+_BLOCK = 4096
+
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_WORD = re.compile(r"\w+")
+
+
+def minhash_signature(text):
+    """Return a NUM_PERM MinHash signature of the text's word 5-shingles.
+
+    Returns None when the text has fewer than MIN_SHINGLES distinct shingles:
+    near-empty texts would all look identical to each other.
+    """
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)) % _PRIME
+
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), _BLOCK):
+        block = hashes[start:start + _BLOCK][None, :]
+        signature = np.minimum(signature, ((_A * block + _B) % _PRIME).min(axis=1))
+    return signature.astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index over the text of every analyzed document.
+
+    Signatures are persisted in ``DocumentSignature`` and the band buckets are
+    rebuilt in memory on first use (and picked up incrementally when other
+    workers add documents).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [{} for _ in range(BANDS)]
+        self.signatures = {}
+        self.last_id = 0
+
+    def _bands(self, signature):
+        return [signature[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+    def _insert(self, document_hash, signature):
+        self.signatures[document_hash] = signature
+        for bucket, band in zip(self.buckets, self._bands(signature)):
+            bucket.setdefault(band, set()).add(document_hash)
+
+    def _sync(self):
+        for row in DocumentSignature.objects.filter(id__gt=self.last_id).order_by("id").values("id", "document_hash", "signature"):
+            self._insert(row["document_hash"], np.frombuffer(bytes(row["signature"]), dtype=np.uint32))
+            self.last_id = row["id"]
+
+    def find(self, signature, threshold=None):
+        """Return previously seen documents whose estimated Jaccard similarity reaches the threshold."""
+        threshold = threshold if threshold is not None else getattr(settings, "DEDUP_SIMILARITY_THRESHOLD", 0.8)
+        with self.lock:
+            self._sync()
+            candidates = set()
+            for bucket, band in zip(self.buckets, self._bands(signature)):
+                candidates |= bucket.get(band, set())
+            matches = [
+                (document_hash, float(np.mean(self.signatures[document_hash] == signature)))
+                for document_hash in candidates
+            ]
+        matches = sorted((m for m in matches if m[1] >= threshold), key=lambda m: m[1], reverse=True)
+        if not matches:
+            return []
+        rows = DocumentSignature.objects.in_bulk([m[0] for m in matches], field_name="document_hash")
+        return [
+            {
+                "document_hash": document_hash,
+                "source": rows[document_hash].source if document_hash in rows else "",
+                "similarity": similarity,
+            }
+            for document_hash, similarity in matches
+        ]
+
+    def add(self, document_hash, source, signature):
+        """Record a document's signature."""
+        DocumentSignature.objects.get_or_create(
+            document_hash=document_hash,
+            defaults={
+                "source": (source or "")[:255],
+                "signature": signature.astype(np.uint32).tobytes(),
+            },
+        )
+        with self.lock:
+            self._sync()
+
+    def reusable_analysis(self, matches, questions_hash, financial_facts=None):
+        """Return (match, Analysis) for the closest duplicate whose latest analysis can be reused.
+
+        With ``financial_facts``, an analysis is only reused if its document
+        reported the same approved and expenditure amounts: near-identical
+        text with different figures is exactly what needs a fresh review.
+        """
+        threshold = getattr(settings, "DEDUP_REUSE_THRESHOLD", 0.9)
+        for match in matches:
+            if match["similarity"] < threshold:
+                break
+            analysis = (
+                Analysis.objects
+                .filter(document_hash=match["document_hash"], questions_hash=questions_hash, reused_from__isnull=True)
+                .exclude(status="FAILED")
+                .first()
+            )
+            if analysis is not None and _same_figures(analysis, financial_facts):
+                return match, analysis
+        return None, None
+
+
+def _same_figures(analysis, financial_facts):
+    if financial_facts is None:
+        return True
+    prior = (analysis.report or {}).get("financial_facts") or {}
+    return all(
+        prior.get(key) == financial_facts[key]
+        for key in ("currency", "approved_amount", "expenditure_amount")
+    )
+
+
+near_duplicate_index = NearDuplicateIndex()
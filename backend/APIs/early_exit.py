@@ -0,0 +1,116 @@
+import json
+import os
+import re
+
+from .routing import QUESTION_CLASSES
+
+# Ordered evaluation: red-flag questions first, and a decisive answer ends the run
+EARLY_EXIT_ENABLED = os.getenv("EARLY_EXIT_MODE", "off").lower() == "ordered"
+
+# Question classes in the order they are evaluated
+CLASS_PRIORITY = ["red_flag", "analysis", "factual"]
+
+# Misuse vocabulary, unless it names a safeguard ("fraud detection", "anti-embezzlement audit")
+_MISUSE = (
+    r"\b(fraud\w*|misappropriat\w*|embezzl\w*|diversion of funds|falsif\w*|forge[dr]\w*)\b"
+    r"(?![\s-]+(detection|prevention|controls?|hotlines?|checks?|polic(y|ies)|safeguards?|audits?|measures?"
+    r"|training|awareness|monitoring|risks?)\b)"
+)
+
+# Rules are checked in order against each answer of a question in one of their classes
+DEFAULT_RULES = [
+    {
+        "name": "misuse_of_funds",
+        "classes": ["red_flag"],
+        # Only an affirmed finding counts: "yes ... fraud", "evidence of misappropriation",
+        # "invoices were falsified", "diverted funds"; a mention ("a fraud hotline") does not
+        "pattern": r"^yes\b.*?" + _MISUSE
+                   + r"|\b(evidence|signs?|indications?|instances?|cases?|proof) of (\w+ ){0,3}?" + _MISUSE
+                   + r"|\b(funds?|money|grant|amounts?|invoices?|receipts?|bills?|records?|accounts?|documents?|figures)"
+                     r" ((may|might|could) )?(were|was|are|is|have been|has been|had been|appears?( to be)?|seems?( to be)?)"
+                     r" (\w+ )?(diverted|misappropriated|embezzled|siphoned|falsified|forged|inflated)\b"
+                     r"|\b(diverted|misappropriated|embezzled|siphoned( off)?) (the |project |grant )?(funds?|money)\b",
+        "decision": "REJECTED",
+    },
+    {
+        "name": "red_flag_confirmed",
+        "classes": ["red_flag"],
+        # The sentence must affirm a concern itself; a bare "Yes." is not evidence
+        "pattern": r"^(yes\b.*?|there (are|is|were|was) (several |multiple |some |a few |significant |clear )?)"
+                   r"\b(red flags?|concerns?|discrepanc\w+|irregularit\w+)\b",
+        "decision": "REVIEW",
+    },
+]
+
+# Words that turn a sentence's match into a statement that the problem is absent
+# or guarded against ("measures to prevent misappropriation", "anti-fraud audits")
+_NEGATION = re.compile(
+    r"\b(no|not|none|never|without|nor|prevent\w*|avoid\w*|against|safeguards?|anti)\b|n't\b", re.IGNORECASE
+)
+_SENTENCE = re.compile(r"[^.;!?\n]+")
+# Hedged findings ("possible fraud") are sent for review rather than rejected
+_HEDGE = re.compile(r"\b(possibl[ey]|potential(ly)?|may|might|could|suspect\w*|alleged(ly)?|risk of)\b", re.IGNORECASE)
+
+
+def load_rules():
+    """Return the early-exit rules, from EARLY_EXIT_RULES (inline JSON or a file path) if set."""
+    configured = os.getenv("EARLY_EXIT_RULES")
+    if not configured:
+        rules = DEFAULT_RULES
+    elif configured.lstrip().startswith("["):
+        rules = json.loads(configured)
+    else:
+        with open(configured, encoding="utf-8") as f:
+            rules = json.load(f)
+    compiled = []
+    for rule in rules:
+        if rule.get("decision") not in ("REJECTED", "REVIEW"):
+            raise ValueError(f"Early-exit rule {rule.get('name')} must decide REJECTED or REVIEW")
+        compiled.append({
+            **rule,
+            "classes": rule.get("classes", ["red_flag"]),
+            "regex": re.compile(rule["pattern"], re.IGNORECASE),
+        })
+    return compiled
+
+
+def order_questions(questions):
+    """Sort questions by class priority, keeping the given order within a class."""
+    return sorted(questions, key=lambda q: CLASS_PRIORITY.index(QUESTION_CLASSES.get(q, "analysis")))
+
+
+def evaluate(question, answer, rules):
+    """Return the first rule the answer triggers as an early-exit record, or None.
+
+    A match is ignored when its sentence negates it before or within the
+    match ("there is no evidence of fraud", "yes, there are no concerns"),
+    and a hedged one ("possible fraud") is downgraded from REJECTED to REVIEW.
+    """
+    question_class = QUESTION_CLASSES.get(question, "analysis")
+    for rule in rules:
+        if question_class not in rule["classes"]:
+            continue
+        for sentence in _SENTENCE.finditer(answer):
+            text = sentence.group().strip()
+            match = rule["regex"].search(text)
+            if match and not _NEGATION.search(text[:match.end()]):
+                decision = rule["decision"]
+                if decision == "REJECTED" and _HEDGE.search(text[:match.end()]):
+                    decision = "REVIEW"
+                return {
+                    "rule": rule["name"],
+                    "decision": decision,
+                    "question": question,
+                    "evidence": text[:300],
+                }
+    return None
+
+
+def early_exit_decision(early_exit):
+    """Decision text for a run ended by an early-exit rule."""
+    return (
+        f"DECISION: {early_exit['decision']}\n\n"
+        f"The evaluation stopped early: rule '{early_exit['rule']}' matched the answer to "
+        f"\"{early_exit['question']}\": \"{early_exit['evidence']}\". "
+        f"{len(early_exit['skipped_questions'])} remaining questions were not evaluated."
+    )
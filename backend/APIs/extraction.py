@@ -0,0 +1,371 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# Standard questions that can be answered from extracted figures without an LLM call
+APPROVED_AMOUNT_QUESTION = "What is the amount of budget installment approved from government?"
+UTILIZATION_QUESTION = "how fund is being utilized for different work, and does this match with the expenditure?"
+RELEASED_VS_EXPENDITURE_QUESTION = "Is the fund released by government matches with the expenditure?"
+DISCREPANCY_QUESTION = "is there any disperencies in fund utilization?"
+
+FINANCIAL_QUESTIONS = [
+    APPROVED_AMOUNT_QUESTION,
+    UTILIZATION_QUESTION,
+    RELEASED_VS_EXPENDITURE_QUESTION,
+    DISCREPANCY_QUESTION,
+]
+
+# Relative difference tolerated before two totals are reported as a mismatch
+MISMATCH_TOLERANCE = 0.01
+
+CURRENCY_ALIASES = {
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "rupees": "INR",
+    "$": "USD", "usd": "USD", "dollars": "USD",
+    "eth": "ETH",
+}
+
+SCALES = {
+    "k": 1e3, "thousand": 1e3,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5,
+    "million": 1e6, "mn": 1e6,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+}
+
+_NUMBER = r"\d[\d,]*(?:\.\d+)?"
+_SCALE = r"(?:\s*(?P<{name}>thousand|lakhs?|lac|million|mn|crores?|cr|k)\b)?"
+
+AMOUNT_PATTERN = re.compile(
+    r"(?P<prefix>₹|\$|\bRs\.?|\bINR\b|\bUSD\b)\s*(?P<num1>" + _NUMBER + ")" + _SCALE.format(name="scale1")
+    + r"|(?P<num2>" + _NUMBER + ")" + _SCALE.format(name="scale2")
+    + r"\s*(?P<suffix>ETH|INR|USD|rupees|dollars)\b",
+    re.IGNORECASE,
+)
+
+APPROVED_KEYWORDS = ("approved", "sanctioned", "released", "installment", "instalment", "allocated", "allocation", "budget", "grant",
+                     "estimated cost")
+EXPENDITURE_KEYWORDS = ("expenditure", "spent", "utilized", "utilised", "paid", "expense", "actual", "cost incurred")
+TOTAL_KEYWORDS = ("total", "grand total", "sum")
+
+# Table rows are tokenized on whitespace (PDF text extraction pads every word with spaces) and pipes
+_TOKEN_SPLIT = re.compile(r"[\s|]+")
+_NUMERIC_TOKEN = re.compile(r"^(?:₹|\$|Rs\.?)?(" + _NUMBER + r")$", re.IGNORECASE)
+_UNIT_TOKEN = re.compile(r"^\(?(?:₹|\$|Rs\.?|INR|USD|ETH|rupees|dollars)\)?$", re.IGNORECASE)
+# Longer labels, or ones ending in ":", are prose or "key: value" bullets rather than table rows
+MAX_LABEL_WORDS = 8
+
+
+def _to_float(number):
+    return float(number.replace(",", ""))
+
+
+def _classify(context):
+    """Return 'expenditure', 'approved' or None for the text immediately before an amount."""
+    context = context.lower()
+    best_kind, best_pos = None, -1
+    for kind, keywords in (("approved", APPROVED_KEYWORDS), ("expenditure", EXPENDITURE_KEYWORDS)):
+        for keyword in keywords:
+            pos = context.rfind(keyword)
+            if pos > best_pos:
+                best_kind, best_pos = kind, pos
+    return best_kind
+
+
+def extract_amounts(text):
+    """Find currency amounts in free text together with their kind and surrounding line."""
+    amounts = []
+    previous = ""
+    for line in text.splitlines():
+        for match in AMOUNT_PATTERN.finditer(line):
+            if match.group("num1"):
+                number, scale, currency = match.group("num1"), match.group("scale1"), match.group("prefix")
+            else:
+                number, scale, currency = match.group("num2"), match.group("scale2"), match.group("suffix")
+            value = _to_float(number) * SCALES.get((scale or "").lower(), 1)
+            preceding = line[max(0, match.start() - 80):match.start()]
+            if not preceding.strip():
+                # The label sits on the line above ("Total Estimated Cost" / "20 ETH")
+                preceding = previous[-80:]
+            amounts.append({
+                "value": value,
+                "currency": CURRENCY_ALIASES.get(currency.lower(), currency.upper()),
+                "kind": _classify(preceding),
+                "is_total": any(keyword in preceding.lower() for keyword in TOTAL_KEYWORDS),
+                "context": line.strip()[:200],
+            })
+        if line.strip():
+            previous = line.strip()
+    return amounts
+
+
+def _parse_row(line):
+    """Split a line into (label, values, has_unit), or None if it holds no numbers.
+
+    The values are the longest run of numeric cells (units such as "ETH" may
+    follow each number); anything after the run, like a status column, is
+    ignored. A line of numbers only has an empty label.
+    """
+    tokens = [token for token in _TOKEN_SPLIT.split(line.strip()) if token]
+    runs, run = [], None
+    for index, token in enumerate(tokens):
+        number = _NUMERIC_TOKEN.match(token)
+        if number:
+            if run is None:
+                start = index
+                while start and _UNIT_TOKEN.match(tokens[start - 1]):  # "Rs. 500"
+                    start -= 1
+                run = {"start": start, "values": [], "has_unit": start < index}
+                runs.append(run)
+            run["values"].append(_to_float(number.group(1)))
+            run["has_unit"] = run["has_unit"] or not token[0].isdigit()
+        elif run is not None and _UNIT_TOKEN.match(token):
+            run["has_unit"] = True
+        else:
+            run = None
+    if not runs:
+        return None
+    best = max(runs, key=lambda r: len(r["values"]))  # earliest run wins ties
+    return " ".join(tokens[:best["start"]]), best["values"], best["has_unit"]
+
+
+def _is_label(text):
+    return bool(re.search(r"[^\W\d_]", text)) and len(text.split()) <= MAX_LABEL_WORDS and not text.endswith(":")
+
+
+def _header_cells(line):
+    if "\t" in line or "|" in line:
+        cells = re.split(r"\t+|\s*\|\s*", line.strip().strip("|"))
+    else:
+        cells = [token for token in line.split() if not _UNIT_TOKEN.match(token)]
+    return [cell.lower() for cell in cells if cell]
+
+
+def extract_tables(text):
+    """Detect runs of consecutive label/number rows and return them as tables.
+
+    A row's label may sit alone on the line above its numbers, as PDF text
+    extraction often wraps long labels. The last text line before the first
+    row is taken as the header.
+    """
+    tables, header, rows, pending = [], None, [], None
+
+    def flush():
+        if len(rows) >= 2:
+            tables.append({"header": header, "rows": list(rows)})
+        rows.clear()
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = _parse_row(line)
+        if row and row[0] and _is_label(row[0]):
+            if pending is not None:
+                if rows:
+                    flush()
+                header = _header_cells(pending)
+                pending = None
+            rows.append({"label": row[0], "values": row[1], "has_unit": row[2]})
+        elif row and not row[0] and pending is not None and _is_label(pending):
+            rows.append({"label": " ".join(pending.split()), "values": row[1], "has_unit": row[2]})
+            pending = None
+        else:
+            if pending is not None or row:
+                flush()
+                header = None
+            pending = line.strip()
+    flush()
+    return tables
+
+
+def _column_for(header, keywords):
+    if not header:
+        return None
+    for index, cell in enumerate(header[1:]):
+        if any(keyword in cell for keyword in keywords):
+            return index
+    return None
+
+
+def _summarize_table(table):
+    """Compute per-column sums of line items and compare them with any stated total rows.
+
+    Budget and expenditure totals come from the stated total row when there
+    is one, otherwise from the column sums.
+    """
+    width = min(len(row["values"]) for row in table["rows"])
+    is_total = np.array([row["label"].lower().strip() in TOTAL_KEYWORDS or row["label"].lower().startswith("total")
+                         for row in table["rows"]])
+    values = np.array([row["values"][:width] for row in table["rows"]], dtype=float)
+
+    items = values[~is_total]
+    column_sums = items.sum(axis=0)
+    stated = values[is_total][-1] if is_total.any() else None
+
+    summary = {
+        "header": table["header"],
+        "line_items": [
+            {"label": row["label"], "values": row["values"][:width]}
+            for row, total in zip(table["rows"], is_total) if not total
+        ],
+        "column_sums": column_sums.tolist(),
+        "stated_totals": stated.tolist() if stated is not None else None,
+        "total_mismatches": [],
+        "has_currency": any(row["has_unit"] for row in table["rows"]),
+    }
+    if stated is not None and len(items) >= 2:
+        diff = np.abs(column_sums - stated)
+        bad = diff > MISMATCH_TOLERANCE * np.maximum(np.abs(stated), 1)
+        summary["total_mismatches"] = [
+            {"column": int(i), "computed": float(column_sums[i]), "stated": float(stated[i])}
+            for i in np.flatnonzero(bad)
+        ]
+
+    budget_col = _column_for(table["header"], APPROVED_KEYWORDS)
+    spent_col = _column_for(table["header"], EXPENDITURE_KEYWORDS)
+    if (budget_col is not None and spent_col is not None and budget_col != spent_col
+            and max(budget_col, spent_col) < width and len(items)):
+        over = items[:, spent_col] - items[:, budget_col]
+        summary["over_budget_items"] = [
+            {"label": item["label"], "budget": float(items[i, budget_col]), "spent": float(items[i, spent_col])}
+            for i, item in enumerate(summary["line_items"]) if over[i] > MISMATCH_TOLERANCE * max(items[i, budget_col], 1)
+        ]
+        totals = stated if stated is not None else column_sums
+        summary["budget_total"] = float(totals[budget_col])
+        summary["expenditure_total"] = float(totals[spent_col])
+        summary["has_currency"] = True
+    return summary
+
+
+def _mismatch(a, b):
+    return abs(a - b) > MISMATCH_TOLERANCE * max(abs(a), abs(b), 1)
+
+
+def _overspent(approved, expenditure):
+    # Spending less than approved is normal; only overspending is a discrepancy
+    return approved is not None and expenditure is not None and expenditure > approved and _mismatch(approved, expenditure)
+
+
+def extract_financial_facts(documents):
+    """Extract budget and expenditure figures from loaded documents."""
+    text = "\n".join(doc.page_content for doc in documents)
+    amounts = extract_amounts(text)
+    tables = [_summarize_table(table) for table in extract_tables(text)]
+
+    currencies = Counter(amount["currency"] for amount in amounts)
+    currency = currencies.most_common(1)[0][0] if currencies else None
+    primary = [amount for amount in amounts if amount["currency"] == currency]
+
+    values = np.array([amount["value"] for amount in primary], dtype=float)
+    kinds = np.array([amount["kind"] or "" for amount in primary])
+    totals = np.array([amount["is_total"] for amount in primary], dtype=bool)
+
+    def pick(kind):
+        # Only an explicitly stated total counts; a line item is not the amount
+        stated = values[(kinds == kind) & totals]
+        return float(stated[-1]) if stated.size else None
+
+    # A budget-vs-spent table gives a consistent pair; free-text totals may
+    # describe the whole project rather than this report
+    budget_table = next((table for table in tables if "budget_total" in table), None)
+    if budget_table is not None:
+        approved, expenditure = budget_table["budget_total"], budget_table["expenditure_total"]
+    else:
+        approved, expenditure = pick("approved"), pick("expenditure")
+
+    discrepancies = []
+    if _overspent(approved, expenditure):
+        discrepancies.append(
+            f"Reported expenditure {_fmt(expenditure, currency)} exceeds the approved amount {_fmt(approved, currency)}."
+        )
+    for table in tables:
+        for mismatch in table["total_mismatches"]:
+            discrepancies.append(
+                f"Table line items sum to {_fmt(mismatch['computed'], currency)} but the stated total is "
+                f"{_fmt(mismatch['stated'], currency)}."
+            )
+        for item in table.get("over_budget_items", []):
+            discrepancies.append(
+                f"'{item['label']}' spent {_fmt(item['spent'], currency)} against a budget of {_fmt(item['budget'], currency)}."
+            )
+
+    return {
+        "currency": currency,
+        "amounts": amounts,
+        "tables": tables,
+        "approved_amount": approved,
+        "expenditure_amount": expenditure,
+        "discrepancies": discrepancies,
+    }
+
+
+def _fmt(value, currency):
+    text = f"{value:,.2f}".rstrip("0").rstrip(".")
+    return f"{text} {currency}" if currency else text
+
+
+def _breakdown(facts):
+    for table in facts["tables"]:
+        if table["line_items"] and table["has_currency"]:
+            return "; ".join(
+                f"{item['label']}: {_fmt(item['values'][-1], facts['currency'])}" for item in table["line_items"][:15]
+            )
+    return None
+
+
+def answer_financial_questions(facts, questions):
+    """Answer the financial standard questions from extracted facts.
+
+    Returns a dict mapping question to answer for every question the facts are
+    sufficient for; the rest should go through the QA chain as usual.
+    """
+    currency = facts["currency"]
+    approved = facts["approved_amount"]
+    expenditure = facts["expenditure_amount"]
+    answers = {}
+
+    if APPROVED_AMOUNT_QUESTION in questions and approved is not None:
+        answers[APPROVED_AMOUNT_QUESTION] = f"The approved budget amount stated in the document is {_fmt(approved, currency)}."
+
+    if approved is not None and expenditure is not None:
+        if _overspent(approved, expenditure):
+            comparison = (f"No. The reported expenditure {_fmt(expenditure, currency)} exceeds the approved/released "
+                          f"amount {_fmt(approved, currency)}.")
+        elif _mismatch(approved, expenditure):
+            comparison = (f"The reported expenditure {_fmt(expenditure, currency)} is within the approved/released "
+                          f"amount {_fmt(approved, currency)}, leaving {_fmt(approved - expenditure, currency)} unspent.")
+        else:
+            comparison = (f"Yes. The approved/released amount {_fmt(approved, currency)} matches the reported "
+                          f"expenditure {_fmt(expenditure, currency)}.")
+        if RELEASED_VS_EXPENDITURE_QUESTION in questions:
+            answers[RELEASED_VS_EXPENDITURE_QUESTION] = comparison
+        breakdown = _breakdown(facts)
+        if UTILIZATION_QUESTION in questions and breakdown:
+            answers[UTILIZATION_QUESTION] = f"Fund utilization by work item: {breakdown}. {comparison}"
+
+    if DISCREPANCY_QUESTION in questions and (facts["discrepancies"] or (approved is not None and expenditure is not None)):
+        if facts["discrepancies"]:
+            answers[DISCREPANCY_QUESTION] = "Yes. " + " ".join(facts["discrepancies"])
+        else:
+            answers[DISCREPANCY_QUESTION] = "No discrepancies were found between the approved amount, line items and expenditure."
+
+    return answers
+
+
+def format_financial_facts(facts):
+    """Render extracted facts as a block of text for the decision prompt."""
+    if not facts or (facts["approved_amount"] is None and facts["expenditure_amount"] is None and not facts["tables"]):
+        return ""
+    currency = facts["currency"]
+    lines = ["Extracted financial figures (computed directly from the document):"]
+    if facts["approved_amount"] is not None:
+        lines.append(f"- Approved/released amount: {_fmt(facts['approved_amount'], currency)}")
+    if facts["expenditure_amount"] is not None:
+        lines.append(f"- Reported expenditure: {_fmt(facts['expenditure_amount'], currency)}")
+    breakdown = _breakdown(facts)
+    if breakdown:
+        lines.append(f"- Line items: {breakdown}")
+    if facts["discrepancies"]:
+        lines.extend(f"- Discrepancy: {item}" for item in facts["discrepancies"])
+    else:
+        lines.append("- No numeric discrepancies detected")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,307 @@
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+from django.conf import settings
+
+# UnixFS importer defaults used by `ipfs add` / Pinata
+CHUNK_SIZE = 256 * 1024
+MAX_LINKS = 174
+
+_BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_SHA2_256 = 0x12
+_DAG_PB = 0x70
+_RAW = 0x55
+
+
+class CIDError(ValueError):
+    pass
+
+
+class ContentTooLarge(CIDError):
+    """The content behind a CID exceeds IPFS_MAX_BYTES."""
+
+    def __init__(self, max_bytes):
+        super().__init__(f"IPFS content exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+
+def _max_bytes():
+    return getattr(settings, "IPFS_MAX_BYTES", 50 * 1024 * 1024)
+
+
+# CID parsing
+
+def _b58decode(text):
+    num = 0
+    for char in text:
+        index = _BASE58.find(char)
+        if index < 0:
+            raise CIDError(f"Invalid base58 character in CID: {char}")
+        num = num * 58 + index
+    raw = num.to_bytes((num.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(text) - len(text.lstrip("1"))) + raw
+
+
+def _b58encode(raw):
+    num = int.from_bytes(raw, "big")
+    text = ""
+    while num:
+        num, rem = divmod(num, 58)
+        text = _BASE58[rem] + text
+    return "1" * (len(raw) - len(raw.lstrip(b"\0"))) + text
+
+
+def _read_varint(raw, pos):
+    value = shift = 0
+    while True:
+        byte = raw[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def parse_cid(cid):
+    """Return (version, codec, sha256 digest) for a CIDv0 or base32 CIDv1 string."""
+    cid = cid.strip()
+    if cid.startswith("Qm") and len(cid) == 46:
+        multihash = _b58decode(cid)
+        version, codec = 0, _DAG_PB
+    elif cid.startswith("b"):
+        body = cid[1:].upper()
+        try:
+            raw = base64.b32decode(body + "=" * (-len(body) % 8))
+            version, pos = _read_varint(raw, 0)
+            codec, pos = _read_varint(raw, pos)
+        except (binascii.Error, IndexError):
+            raise CIDError(f"Malformed CID: {cid}")
+        multihash = raw[pos:]
+        if version != 1:
+            raise CIDError(f"Unsupported CID version: {version}")
+    else:
+        raise CIDError("Only CIDv0 (Qm...) and base32 CIDv1 (b...) are supported")
+    if len(multihash) != 34 or multihash[0] != _SHA2_256 or multihash[1] != 32:
+        raise CIDError("Only sha2-256 CIDs can be verified")
+    if codec not in (_DAG_PB, _RAW):
+        raise CIDError(f"Unsupported CID codec: {hex(codec)}")
+    return version, codec, multihash[2:]
+
+
+def _make_cid(version, codec, block):
+    multihash = bytes([_SHA2_256, 32]) + hashlib.sha256(block).digest()
+    if version == 0:
+        return _b58encode(multihash)
+    return "b" + base64.b32encode(_varint(1) + _varint(codec) + multihash).decode().lower().rstrip("=")
+
+
+# UnixFS file DAG (balanced layout, fixed-size chunker) used to recompute a CID from content
+
+def _field_bytes(number, value):
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _field_varint(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _unixfs_file(data=None, filesize=0, blocksizes=()):
+    out = _field_varint(1, 2)  # Type: File
+    if data:
+        out += _field_bytes(2, data)
+    out += _field_varint(3, filesize)
+    for size in blocksizes:
+        out += _field_varint(4, size)
+    return out
+
+
+def _pb_node(links, data):
+    out = b""
+    for cid_bytes, tsize in links:
+        out += _field_bytes(2, _field_bytes(1, cid_bytes) + _field_bytes(2, b"") + _field_varint(3, tsize))
+    return out + _field_bytes(1, data)
+
+
+def compute_cid(content, version=0):
+    """Compute the CID `ipfs add` would assign to the content (CIDv1 implies raw leaves)."""
+    raw_leaves = version == 1
+
+    def cid_bytes(codec, block):
+        digest = bytes([_SHA2_256, 32]) + hashlib.sha256(block).digest()
+        return digest if version == 0 else _varint(1) + _varint(codec) + digest
+
+    # Each level holds (cid bytes, cumulative tsize, file bytes, codec, block)
+    level = []
+    for start in range(0, max(len(content), 1), CHUNK_SIZE):
+        chunk = content[start:start + CHUNK_SIZE]
+        if raw_leaves:
+            level.append((cid_bytes(_RAW, chunk), len(chunk), len(chunk), _RAW, chunk))
+        else:
+            block = _pb_node([], _unixfs_file(chunk, len(chunk)))
+            level.append((cid_bytes(_DAG_PB, block), len(block), len(chunk), _DAG_PB, block))
+
+    while len(level) > 1:
+        parents = []
+        for start in range(0, len(level), MAX_LINKS):
+            children = level[start:start + MAX_LINKS]
+            filesize = sum(child[2] for child in children)
+            block = _pb_node(
+                [(child[0], child[1]) for child in children],
+                _unixfs_file(filesize=filesize, blocksizes=[child[2] for child in children]),
+            )
+            tsize = len(block) + sum(child[1] for child in children)
+            parents.append((cid_bytes(_DAG_PB, block), tsize, filesize, _DAG_PB, block))
+        level = parents
+
+    _, _, _, codec, block = level[0]
+    return _make_cid(version, codec, block)
+
+
+def verify_cid(cid, content):
+    """Return True if the content hashes to the given CID."""
+    version, codec, digest = parse_cid(cid)
+    if codec == _RAW:
+        return hashlib.sha256(content).digest() == digest
+    return parse_cid(compute_cid(content, version))[2] == digest
+
+
+# Fetchers
+
+class GatewayFetcher:
+    """Fetches content from an HTTP IPFS gateway."""
+
+    def __init__(self, base_url, timeout=60, max_bytes=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_bytes = max_bytes or _max_bytes()
+
+    def fetch(self, cid):
+        """Download the content, stopping as soon as it exceeds ``max_bytes``."""
+        with requests.get(f"{self.base_url}/ipfs/{cid}", timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            if int(response.headers.get("Content-Length") or 0) > self.max_bytes:
+                raise ContentTooLarge(self.max_bytes)
+            content = bytearray()
+            for block in response.iter_content(CHUNK_SIZE):
+                content += block
+                if len(content) > self.max_bytes:
+                    raise ContentTooLarge(self.max_bytes)
+        return bytes(content)
+
+
+class LocalDirectoryFetcher:
+    """Local stand-in gateway serving files stored as <dir>/<cid>."""
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes or _max_bytes()
+
+    def fetch(self, cid):
+        path = self.directory / cid
+        if not path.is_file():
+            raise FileNotFoundError(f"CID {cid} not found in local gateway directory {self.directory}")
+        if path.stat().st_size > self.max_bytes:
+            raise ContentTooLarge(self.max_bytes)
+        return path.read_bytes()
+
+    def add(self, content, version=0):
+        cid = compute_cid(content, version)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / cid).write_bytes(content)
+        return cid
+
+
+def get_fetcher():
+    if getattr(settings, "IPFS_FETCHER", "gateway") == "local":
+        return LocalDirectoryFetcher(settings.IPFS_LOCAL_GATEWAY_DIR)
+    return GatewayFetcher(getattr(settings, "IPFS_GATEWAY_URL", "https://gateway.pinata.cloud"))
+
+
+# Cache
+
+class BlobCache:
+    """
+    Size-bounded, content-addressed LRU cache of IPFS blobs on disk.
+
+    Blobs are only stored after their content has been verified against the
+    CID, so a hit never needs re-verification. Recency is tracked with file
+    mtimes, which also makes the cache shareable between workers.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, fetcher=None):
+        self.directory = Path(directory or getattr(settings, "IPFS_CACHE_DIR", settings.BASE_DIR / "ipfs_cache"))
+        self.max_bytes = max_bytes or getattr(settings, "IPFS_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+        self.fetcher = fetcher
+        self.lock = threading.Lock()
+
+    def _path(self, cid):
+        return self.directory / cid
+
+    def get(self, cid):
+        """Return (content, cache_hit) for a CID, downloading and verifying on a miss."""
+        parse_cid(cid)  # reject malformed CIDs before touching the filesystem
+        path = self._path(cid)
+        try:
+            content = path.read_bytes()
+            os.utime(path)
+            return content, True
+        except FileNotFoundError:
+            pass
+
+        content = (self.fetcher or get_fetcher()).fetch(cid)
+        if not verify_cid(cid, content):
+            raise CIDError(f"Content fetched for {cid} does not match the CID")
+        self.put(cid, content)
+        return content, False
+
+    def put(self, cid, content):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False, suffix=".tmp") as tmp:
+            tmp.write(content)
+        os.replace(tmp.name, self._path(cid))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used blobs until the cache fits in max_bytes."""
+        with self.lock:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry) for entry in self.directory.iterdir()
+                       if entry.is_file() and not entry.name.endswith(".tmp")]
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    entry.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+blob_cache = BlobCache()
+
+
+def guess_filename(cid, content):
+    """Pick a file name whose extension lets load_document choose the right loader."""
+    if content.startswith(b"%PDF"):
+        return f"{cid}.pdf"
+    if content.startswith(b"PK"):
+        return f"{cid}.docx"
+    return f"{cid}.txt"
@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import hashlib
+from functools import lru_cache
+from typing import Any, Optional
+
+import requests
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import BaseMessage
+
+# Provider used for every LLM call: groq, openai_compatible, llamacpp or fake
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+
+DEFAULT_MODELS = {
+    "groq": "llama-3.1-8b-instant",
+    "openai_compatible": os.getenv("LLM_LOCAL_MODEL", "local-model"),
+    "llamacpp": os.getenv("LLM_LOCAL_MODEL_PATH", ""),
+    "fake": "fake-deterministic",
+}
+
+
+def _messages_to_text(messages):
+    return "\n".join(str(message.content) for message in messages)
+
+
+class OpenAICompatibleChatModel(SimpleChatModel):
+    """Chat model backed by a local OpenAI-compatible server (llama.cpp server, vLLM, Ollama)."""
+
+    base_url: str = "http://127.0.0.1:8080/v1"
+    model_name: str = "local-model"
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    timeout: float = 120.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai-compatible"
+
+    def _call(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        roles = {"human": "user", "ai": "assistant", "system": "system"}
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": roles.get(m.type, "user"), "content": m.content} for m in messages],
+            "temperature": self.temperature,
+        }
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        if stop:
+            payload["stop"] = stop
+        response = requests.post(f"{self.base_url.rstrip('/')}/chat/completions", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+
+class FakeDeterministicChatModel(SimpleChatModel):
+    """
+    Offline chat model whose reply depends only on the prompt.
+
+    Useful for running the whole pipeline without network access and for
+    measuring everything except model latency. ``latency`` adds a fixed delay.
+    """
+
+    model_name: str = "fake-deterministic"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-deterministic"
+
+    def _call(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = _messages_to_text(messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        if "DECISION:" in prompt:
+            return f"DECISION: REVIEW\nDeterministic offline review (ref {digest})."
+        question = re.search(r"Question:\s*(.+)", prompt)
+        question = question.group(1).strip() if question else "the prompt"
+        return f"Offline answer for '{question}' (ref {digest})."
+
+
+@lru_cache(maxsize=4)
+def _load_llamacpp(model_path, n_ctx, n_threads):
+    """Load GGUF weights once per process and context size."""
+    try:
+        from langchain_community.chat_models import ChatLlamaCpp
+    except ImportError:
+        raise ValueError("llamacpp provider requires llama-cpp-python. Please run: pip install llama-cpp-python")
+    return ChatLlamaCpp(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+
+def get_llm(model_name=None, temperature=0, max_tokens=None, provider=None):
+    """Return a LangChain chat model for the configured provider."""
+    provider = (provider or LLM_PROVIDER).lower()
+    model_name = model_name or DEFAULT_MODELS.get(provider)
+
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(model_name=model_name, temperature=temperature, max_tokens=max_tokens)
+    if provider == "openai_compatible":
+        return OpenAICompatibleChatModel(
+            base_url=os.getenv("LLM_LOCAL_BASE_URL", "http://127.0.0.1:8080/v1"),
+            model_name=model_name,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    if provider == "llamacpp":
+        if not model_name:
+            raise ValueError("Set LLM_LOCAL_MODEL_PATH to a GGUF model file to use the llamacpp provider")
+        model = _load_llamacpp(
+            model_name,
+            int(os.getenv("LLM_LOCAL_CONTEXT", 4096)),
+            int(os.getenv("LLM_LOCAL_THREADS", os.cpu_count() or 1)),
+        )
+        # Tiers differ only in sampling settings; the copy shares the loaded weights
+        return model.model_copy(update={"temperature": temperature, "max_tokens": max_tokens or 512})
+    if provider == "fake":
+        return FakeDeterministicChatModel(latency=float(os.getenv("FAKE_LLM_LATENCY_MS", 0)) / 1000)
+    raise ValueError(f"Unsupported LLM provider: {provider}")
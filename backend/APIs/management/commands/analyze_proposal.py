@@ -0,0 +1,44 @@
+import json
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from APIs.proposals import run_proposal_analysis
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt", ".md")
+
+
+class Command(BaseCommand):
+    help = "Analyze every document in a proposal folder (e.g. files/proposal1) with one shared index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("folder")
+        parser.add_argument("--proposal-id", help="proposal id recorded with the analysis (defaults to the folder name)")
+        parser.add_argument("--questions", help="JSON file with a list of custom questions")
+
+    def handle(self, *args, **options):
+        folder = Path(options["folder"])
+        paths = sorted(p for p in folder.iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+        if not paths:
+            raise CommandError(f"No supported documents in {folder}")
+        custom_questions = None
+        if options["questions"]:
+            custom_questions = json.loads(Path(options["questions"]).read_text())
+
+        handles = [open(path, "rb") for path in paths]
+        try:
+            result = run_proposal_analysis(
+                [File(handle, name=path.name) for handle, path in zip(handles, paths)],
+                custom_questions,
+                options["proposal_id"] or folder.resolve().name,
+            )
+        finally:
+            for handle in handles:
+                handle.close()
+
+        for file in result["report"]["files"]:
+            self.stdout.write(f"{'cached' if file['cached'] else 'indexed':>8}  {file['name']} ({file['chunks']} chunks)")
+        self.stdout.write(f"Timings: {result['timings']}")
+        self.stdout.write(f"Analysis {result['analysis_id']}: {result['status']}")
+        self.stdout.write(result["report"]["decision"])
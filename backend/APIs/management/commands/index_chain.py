@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from APIs.chain_indexer import ChainIndexer
+
+
+class Command(BaseCommand):
+    help = "Ingest PublicFundManagement contract events into the local chain index tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rpc-url", help="JSON-RPC endpoint (default: CHAIN_RPC_URL)")
+        parser.add_argument("--contract", help="contract address (default: CHAIN_CONTRACT_ADDRESS or deployments.json)")
+        parser.add_argument("--batch-size", type=int, help="blocks per eth_getLogs request")
+        parser.add_argument("--follow", action="store_true", help="keep polling for new blocks")
+        parser.add_argument("--interval", type=float, default=2.0, help="polling interval in seconds with --follow")
+
+    def handle(self, *args, **options):
+        indexer = ChainIndexer(
+            rpc_url=options["rpc_url"],
+            contract_address=options["contract"],
+            batch_size=options["batch_size"],
+        )
+        if options["follow"]:
+            self.stdout.write(f"Following {indexer.address} (Ctrl+C to stop)")
+            try:
+                indexer.follow(options["interval"])
+            except KeyboardInterrupt:
+                pass
+        else:
+            applied = indexer.sync()
+            self.stdout.write(self.style.SUCCESS(f"Applied {applied} events"))
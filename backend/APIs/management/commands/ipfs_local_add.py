@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from APIs.ipfs import LocalDirectoryFetcher
+
+
+class Command(BaseCommand):
+    help = "Store files in the local stand-in IPFS gateway directory and print their CIDs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--cid-version", type=int, choices=(0, 1), default=0)
+
+    def handle(self, *args, **options):
+        fetcher = LocalDirectoryFetcher(settings.IPFS_LOCAL_GATEWAY_DIR)
+        for path in options["paths"]:
+            with open(path, "rb") as f:
+                cid = fetcher.add(f.read(), options["cid_version"])
+            self.stdout.write(f"{cid}  {path}")
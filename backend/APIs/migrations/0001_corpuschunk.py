@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_hash', models.CharField(max_length=64)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('chunk_index', models.IntegerField()),
+                ('text', models.TextField()),
+                ('embedding', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document_hash', 'chunk_index'), name='unique_corpus_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APIs', '0002_documentsignature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Analysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_hash', models.CharField(max_length=64)),
+                ('questions_hash', models.CharField(blank=True, max_length=64)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('REVIEW', 'Review'), ('FAILED', 'Failed')], max_length=16)),
+                ('decision', models.TextField(blank=True)),
+                ('answers', models.JSONField(default=list)),
+                ('report', models.JSONField(default=dict)),
+                ('timings', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reused_from', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reuses', to='APIs.analysis')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['document_hash', 'questions_hash'], name='APIs_analys_documen_d78ace_idx'), models.Index(fields=['status', '-created_at', '-id'], name='APIs_analys_status_78198c_idx'), models.Index(fields=['-created_at', '-id'], name='APIs_analys_created_622886_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APIs', '0003_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainIndexerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contract_address', models.CharField(max_length=42, unique=True)),
+                ('last_block', models.BigIntegerField(default=-1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChainEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('block_number', models.BigIntegerField()),
+                ('tx_hash', models.CharField(max_length=66)),
+                ('log_index', models.IntegerField()),
+                ('name', models.CharField(max_length=64)),
+                ('proposal_id', models.BigIntegerField(null=True)),
+                ('args', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['block_number', 'log_index'],
+                'indexes': [models.Index(fields=['proposal_id', 'block_number'], name='APIs_chaine_proposa_3cc39d_idx'), models.Index(fields=['name', 'block_number'], name='APIs_chaine_name_4f2dd9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tx_hash', 'log_index'), name='unique_chain_event')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChainProposal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proposal_id', models.BigIntegerField(unique=True)),
+                ('creator', models.CharField(blank=True, max_length=42)),
+                ('recipient', models.CharField(blank=True, max_length=42)),
+                ('description', models.TextField(blank=True)),
+                ('total_amount', models.DecimalField(decimal_places=0, default=0, max_digits=78)),
+                ('state', models.PositiveSmallIntegerField(choices=[(0, 'Created'), (1, 'UnderAuthorityVoting'), (2, 'PublicVoting'), (3, 'Approved'), (4, 'Rejected'), (5, 'InProgress'), (6, 'Completed')], default=0)),
+                ('authority_yes_votes', models.IntegerField(default=0)),
+                ('authority_no_votes', models.IntegerField(default=0)),
+                ('public_yes_votes', models.IntegerField(default=0)),
+                ('public_no_votes', models.IntegerField(default=0)),
+                ('public_voting_end_time', models.BigIntegerField(default=0)),
+                ('current_stage', models.IntegerField(default=0)),
+                ('total_stages', models.IntegerField(default=0)),
+                ('created_block', models.BigIntegerField(default=0)),
+                ('updated_block', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-proposal_id'],
+                'indexes': [models.Index(fields=['state', '-proposal_id'], name='APIs_chainp_state_434a55_idx'), models.Index(fields=['recipient'], name='APIs_chainp_recipie_6969c3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChainStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage_number', models.IntegerField()),
+                ('amount', models.DecimalField(decimal_places=0, default=0, max_digits=78)),
+                ('released_amount', models.DecimalField(decimal_places=0, default=0, max_digits=78)),
+                ('report', models.TextField(blank=True)),
+                ('state', models.PositiveSmallIntegerField(choices=[(0, 'NotStarted'), (1, 'InProgress'), (2, 'Completed')], default=0)),
+                ('proposal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='APIs.chainproposal')),
+            ],
+            options={
+                'ordering': ['stage_number'],
+                'constraints': [models.UniqueConstraint(fields=('proposal', 'stage_number'), name='unique_chain_stage')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChainVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('authority', 'Authority'), ('public', 'Public')], max_length=16)),
+                ('voter', models.CharField(max_length=42)),
+                ('vote', models.BooleanField()),
+                ('comment', models.TextField(blank=True)),
+                ('block_number', models.BigIntegerField()),
+                ('proposal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='APIs.chainproposal')),
+            ],
+            options={
+                'ordering': ['block_number', 'id'],
+                'indexes': [models.Index(fields=['proposal', 'kind'], name='APIs_chainv_proposa_f86791_idx'), models.Index(fields=['voter'], name='APIs_chainv_voter_138d7a_idx')],
+            },
+        ),
+    ]
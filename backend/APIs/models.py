@@ -1,3 +1,272 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class CorpusChunk(models.Model):
+    """A chunk of an analyzed document in the cross-proposal similarity corpus.
+
+    The primary key doubles as the vector id in the FAISS corpus index.
+    """
+    document_hash = models.CharField(max_length=64)
+    source = models.CharField(max_length=255, blank=True)
+    chunk_index = models.IntegerField()
+    text = models.TextField()
+    embedding = models.BinaryField()  # normalized float32 vector
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The unique constraint's index also serves lookups by document_hash
+        constraints = [
+            models.UniqueConstraint(fields=["document_hash", "chunk_index"], name="unique_corpus_chunk"),
+        ]
+
+    def __str__(self):
+        return f"{self.source or self.document_hash[:12]} #{self.chunk_index}"
+
+
+class DocumentSignature(models.Model):
+    """MinHash signature of an analyzed document's text."""
+    document_hash = models.CharField(max_length=64, unique=True)
+    source = models.CharField(max_length=255, blank=True)
+    signature = models.BinaryField()  # uint32 MinHash values
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.source or self.document_hash[:12]
+
+
+class Analysis(models.Model):
+    """A persisted run of the document analysis pipeline."""
+    STATUS_CHOICES = [
+        ("APPROVED", "Approved"),
+        ("REJECTED", "Rejected"),
+        ("REVIEW", "Review"),
+        ("FAILED", "Failed"),
+    ]
+
+    document_hash = models.CharField(max_length=64)
+    questions_hash = models.CharField(max_length=64, blank=True)
+    source = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES)
+    decision = models.TextField(blank=True)
+    answers = models.JSONField(default=list)
+    report = models.JSONField(default=dict)
+    timings = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    reused_from = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="reuses")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["document_hash", "questions_hash"]),
+            models.Index(fields=["status", "-created_at", "-id"]),
+            models.Index(fields=["-created_at", "-id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.source or self.document_hash[:12]} ({self.status})"
+
+    def to_dict(self, detail=False):
+        data = {
+            "id": self.id,
+            "document_hash": self.document_hash,
+            "source": self.source,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "timings": self.timings,
+            "reused_from": self.reused_from_id,
+        }
+        if detail:
+            data.update({
+                "decision": self.decision,
+                "answers": self.answers,
+                "report": self.report,
+                "error": self.error,
+            })
+        return data
+
+
+class UploadSession(models.Model):
+    """A chunked, resumable upload; bytes are appended to a part file in UPLOAD_DIR."""
+    STATUS_CHOICES = [
+        ("OPEN", "Open"),
+        ("COMPLETE", "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)  # declared total, if known
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="OPEN")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received} bytes, {self.status})"
+
+    def to_dict(self):
+        return {
+            "upload_id": str(self.id),
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.received,
+            "sha256": self.sha256 or None,
+            "status": self.status,
+        }
+
+
+class ChainIndexerState(models.Model):
+    """Last block ingested by the event indexer for a contract."""
+    contract_address = models.CharField(max_length=42, unique=True)
+    last_block = models.BigIntegerField(default=-1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.contract_address} @ {self.last_block}"
+
+
+class ChainEvent(models.Model):
+    """A decoded PublicFundManagement event log; (tx_hash, log_index) makes ingestion idempotent."""
+    block_number = models.BigIntegerField()
+    tx_hash = models.CharField(max_length=66)
+    log_index = models.IntegerField()
+    name = models.CharField(max_length=64)
+    proposal_id = models.BigIntegerField(null=True)
+    args = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["block_number", "log_index"]
+        constraints = [
+            models.UniqueConstraint(fields=["tx_hash", "log_index"], name="unique_chain_event"),
+        ]
+        indexes = [
+            models.Index(fields=["proposal_id", "block_number"]),
+            models.Index(fields=["name", "block_number"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} @ {self.block_number}"
+
+
+class ChainProposal(models.Model):
+    """Proposal state folded from contract events."""
+    STATE_CHOICES = [
+        (0, "Created"),
+        (1, "UnderAuthorityVoting"),
+        (2, "PublicVoting"),
+        (3, "Approved"),
+        (4, "Rejected"),
+        (5, "InProgress"),
+        (6, "Completed"),
+    ]
+
+    proposal_id = models.BigIntegerField(unique=True)
+    creator = models.CharField(max_length=42, blank=True)
+    recipient = models.CharField(max_length=42, blank=True)
+    description = models.TextField(blank=True)
+    total_amount = models.DecimalField(max_digits=78, decimal_places=0, default=0)  # wei
+    state = models.PositiveSmallIntegerField(choices=STATE_CHOICES, default=0)
+    authority_yes_votes = models.IntegerField(default=0)
+    authority_no_votes = models.IntegerField(default=0)
+    public_yes_votes = models.IntegerField(default=0)
+    public_no_votes = models.IntegerField(default=0)
+    public_voting_end_time = models.BigIntegerField(default=0)
+    current_stage = models.IntegerField(default=0)
+    total_stages = models.IntegerField(default=0)
+    created_block = models.BigIntegerField(default=0)
+    updated_block = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-proposal_id"]
+        indexes = [
+            models.Index(fields=["state", "-proposal_id"]),
+            models.Index(fields=["recipient"]),
+        ]
+
+    def __str__(self):
+        return f"Proposal #{self.proposal_id}"
+
+    def to_dict(self):
+        return {
+            "id": self.proposal_id,
+            "creator": self.creator,
+            "recipient": self.recipient,
+            "description": self.description,
+            "total_amount": str(self.total_amount),
+            "state": self.state,
+            "state_name": self.get_state_display(),
+            "authority_yes_votes": self.authority_yes_votes,
+            "authority_no_votes": self.authority_no_votes,
+            "public_yes_votes": self.public_yes_votes,
+            "public_no_votes": self.public_no_votes,
+            "public_voting_end_time": self.public_voting_end_time,
+            "current_stage": self.current_stage,
+            "total_stages": self.total_stages,
+            "updated_block": self.updated_block,
+        }
+
+
+class ChainStage(models.Model):
+    """Stage state folded from contract events."""
+    STATE_CHOICES = [
+        (0, "NotStarted"),
+        (1, "InProgress"),
+        (2, "Completed"),
+    ]
+
+    proposal = models.ForeignKey(ChainProposal, on_delete=models.CASCADE, related_name="stages")
+    stage_number = models.IntegerField()
+    amount = models.DecimalField(max_digits=78, decimal_places=0, default=0)  # wei
+    released_amount = models.DecimalField(max_digits=78, decimal_places=0, default=0)
+    report = models.TextField(blank=True)
+    state = models.PositiveSmallIntegerField(choices=STATE_CHOICES, default=0)
+
+    class Meta:
+        ordering = ["stage_number"]
+        constraints = [
+            models.UniqueConstraint(fields=["proposal", "stage_number"], name="unique_chain_stage"),
+        ]
+
+    def to_dict(self):
+        return {
+            "stage_number": self.stage_number,
+            "amount": str(self.amount),
+            "released_amount": str(self.released_amount),
+            "report": self.report,
+            "state": self.state,
+            "state_name": self.get_state_display(),
+        }
+
+
+class ChainVote(models.Model):
+    """An authority or public vote on a proposal."""
+    KIND_CHOICES = [
+        ("authority", "Authority"),
+        ("public", "Public"),
+    ]
+
+    proposal = models.ForeignKey(ChainProposal, on_delete=models.CASCADE, related_name="votes")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    voter = models.CharField(max_length=42)
+    vote = models.BooleanField()
+    comment = models.TextField(blank=True)
+    block_number = models.BigIntegerField()
+
+    class Meta:
+        ordering = ["block_number", "id"]
+        indexes = [
+            models.Index(fields=["proposal", "kind"]),
+            models.Index(fields=["voter"]),
+        ]
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "voter": self.voter,
+            "vote": self.vote,
+            "comment": self.comment,
+            "block_number": self.block_number,
+        }
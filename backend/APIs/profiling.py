@@ -0,0 +1,247 @@
+import cProfile
+import hmac
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from html import escape
+from pathlib import Path
+
+from django.conf import settings
+
+MODES = ("sample", "cprofile")
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+# Artifact name -> content type
+ARTIFACTS = {
+    "collapsed": "text/plain",
+    "svg": "image/svg+xml",
+    "prof": "application/octet-stream",
+    "txt": "text/plain",
+}
+
+
+def profile_dir():
+    return Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+
+
+def _frame_label(frame):
+    filename = frame.f_code.co_filename
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        filename = filename[marker + len("site-packages") + 1:]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f"{frame.f_code.co_name} ({filename})"
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for a single thread.
+
+    A background thread snapshots the target thread's stack every ``interval``
+    seconds and counts identical stacks, so time spent waiting on the network
+    (e.g. LLM calls) shows up alongside CPU work.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def render_flamegraph(stacks, title="Flame graph", width=1200, row_height=16):
+    """Render a Counter of collapsed stacks as a standalone SVG flame graph."""
+    root = {"children": {}, "count": 0}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"children": {}, "count": 0})
+            node["count"] += count
+
+    rects = []
+    depth_max = 0
+
+    def layout(node, x, depth):
+        nonlocal depth_max
+        for name, child in sorted(node["children"].items()):
+            w = child["count"] / root["count"] * width
+            if w >= 0.5:
+                depth_max = max(depth_max, depth)
+                rects.append((name, child["count"], x, depth, w))
+                layout(child, x, depth + 1)
+            x += w
+
+    if root["count"]:
+        layout(root, 0.0, 0)
+    height = (depth_max + 1) * row_height + 40
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="16">{escape(title)} ({root["count"]} samples)</text>',
+    ]
+    for name, count, x, depth, w in rects:
+        y = height - (depth + 1) * row_height
+        hue = zlib.crc32(name.encode()) % 60
+        percent = count / root["count"] * 100
+        label = escape(name[: int(w / 7)]) if w > 21 else ""
+        out.append(
+            f'<g><title>{escape(name)} ({count} samples, {percent:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{label}</text></g>'
+        )
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+class Profile:
+    """Metadata and artifacts of one profiled run."""
+
+    def __init__(self, mode, **meta):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.meta = meta
+        self.artifacts = {}
+
+    def save(self, duration):
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, content in self.artifacts.items():
+            mode = "wb" if isinstance(content, bytes) else "w"
+            with open(directory / f"{self.id}.{name}", mode) as f:
+                f.write(content)
+        metadata = {
+            "id": self.id,
+            "mode": self.mode,
+            "duration": round(duration, 3),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "artifacts": sorted(self.artifacts),
+            **self.meta,
+        }
+        (directory / f"{self.id}.json").write_text(json.dumps(metadata))
+        prune_profiles()
+        return metadata
+
+
+@contextmanager
+def profile(mode, **meta):
+    """Profile the enclosed block in the current thread and store its artifacts.
+
+    ``mode`` is ``sample`` (wall-clock stack sampling, collapsed stacks and SVG
+    flame graph) or ``cprofile`` (deterministic, pstats dump and text summary).
+    Artifacts are saved even if the block raises.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    run = Profile(mode, **meta)
+    start = time.perf_counter()
+    if mode == "sample":
+        profiler = StackSampler(getattr(settings, "PROFILE_SAMPLE_INTERVAL", 0.005))
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield run
+    finally:
+        if mode == "sample":
+            profiler.stop()
+            run.artifacts["collapsed"] = profiler.collapsed()
+            run.artifacts["svg"] = render_flamegraph(profiler.stacks, title=meta.get("source") or run.id)
+        else:
+            profiler.disable()
+            summary = io.StringIO()
+            stats = pstats.Stats(profiler, stream=summary)
+            stats.sort_stats("cumulative").print_stats(60)
+            run.artifacts["txt"] = summary.getvalue()
+            run.artifacts["prof"] = marshal.dumps(stats.stats)  # same format as Stats.dump_stats
+        duration = time.perf_counter() - start
+        run.save(duration)
+        print(f"Profile {run.id} saved ({mode}, {duration:.2f}s)")
+
+
+def requested_mode(request):
+    """Return the profiling mode for a request, or None when profiling is off.
+
+    The ``X-Profile`` header (``sample``/``cprofile``, ``1`` meaning ``sample``)
+    is honoured for staff users or when it is sent together with the
+    ``PROFILE_TOKEN`` in ``X-Profile-Token``. ``PROFILE_ANALYSES`` profiles every
+    analysis.
+    """
+    header = request.headers.get("X-Profile")
+    if header:
+        token = getattr(settings, "PROFILE_TOKEN", "")
+        allowed = getattr(request.user, "is_staff", False) or (
+            token and hmac.compare_digest(request.headers.get("X-Profile-Token", ""), token)
+        )
+        if allowed:
+            mode = "sample" if header.lower() in ("1", "true", "yes") else header.lower()
+            if mode in MODES:
+                return mode
+    mode = getattr(settings, "PROFILE_ANALYSES", "")
+    return mode if mode in MODES else None
+
+
+def list_profiles(limit=50):
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    files = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [json.loads(path.read_text()) for path in files[:limit]]
+
+
+def get_profile(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = profile_dir() / f"{profile_id}.json"
+    return json.loads(path.read_text()) if path.is_file() else None
+
+
+def artifact_path(profile_id, artifact):
+    if not PROFILE_ID.match(profile_id) or artifact not in ARTIFACTS:
+        return None
+    path = profile_dir() / f"{profile_id}.{artifact}"
+    return path if path.is_file() else None
+
+
+def prune_profiles():
+    """Delete the oldest profiles beyond PROFILE_MAX_COUNT."""
+    directory = profile_dir()
+    keep = getattr(settings, "PROFILE_MAX_COUNT", 200)
+    files = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in files[keep:]:
+        for artifact in directory.glob(f"{path.stem}.*"):
+            artifact.unlink(missing_ok=True)
@@ -0,0 +1,289 @@
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from langchain.prompts import PromptTemplate
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from .artifacts import EXTENSION, Artifact, ArtifactError, write_artifact
+from .early_exit import EARLY_EXIT_ENABLED, early_exit_decision
+from .extraction import answer_financial_questions, extract_financial_facts
+from .models import Analysis
+from .routing import TierMetrics
+from .utils import (
+    STANDARD_QUESTIONS, analyze_document, analyze_document_ordered, compute_file_hash, create_qa_chains, decision_status,
+    get_embeddings, load_document, make_decision, questions_hash, split_documents,
+)
+
+# Retrieved chunks are labelled with their file so answers can compare stages
+DOCUMENT_PROMPT = PromptTemplate(
+    template="[{source}]\n{page_content}",
+    input_variables=["source", "page_content"],
+)
+RETRIEVER_K = 6
+LOCK_STRIPES = 64
+
+
+def proposal_hash(document_hashes):
+    """Content hash of a set of files, independent of upload order."""
+    return hashlib.sha256("\n".join(sorted(document_hashes)).encode()).hexdigest()
+
+
+def chunk_spans(pages, chunks):
+    """Locate each chunk in the page it was split from, as (page index, start, end) rows."""
+    spans = np.zeros((len(chunks), 3), dtype="uint32")
+    page, position = 0, 0
+    for i, chunk in enumerate(chunks):
+        while True:
+            if page >= len(pages):
+                raise ArtifactError("Chunk text not found in its source pages")
+            start = pages[page].page_content.find(chunk.page_content, position)
+            if start >= 0:
+                break
+            page, position = page + 1, 0
+        spans[i] = (page, start, start + len(chunk.page_content))
+        position = start + 1  # consecutive chunks overlap, so the next one starts after this start
+    return spans
+
+
+class ProposalIndexCache:
+    """
+    Per-file artifacts from which a proposal's shared index is assembled.
+
+    Each file is stored once, keyed by content hash, in the compact format of
+    ``artifacts``: its page texts in one offset-indexed buffer, page metadata,
+    the chunks as (page, start, end) spans into the pages and the chunk
+    embeddings as float16. A proposal's FAISS index is rebuilt in memory from
+    the artifacts of its files (no pickles, no re-embedding), so resubmitting
+    a proposal with a new stage report only parses and embeds the new file.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or getattr(settings, "ARTIFACT_CACHE_DIR", settings.BASE_DIR / "artifact_cache"))
+        # A fixed set of striped locks keeps memory bounded; two hashes sharing
+        # a stripe only serialize their (rare) concurrent builds.
+        self.locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, key):
+        return self.locks[int(key[:8], 16) % len(self.locks)]
+
+    def _embedding_model(self):
+        embeddings = get_embeddings()
+        return getattr(embeddings, "model_name", type(embeddings).__name__)
+
+    def path(self, document_hash):
+        return self.directory / f"{document_hash}{EXTENSION}"
+
+    def _read(self, document_hash, model, name):
+        """Return the cached entry of a file, or None if missing or built with another model.
+
+        The artifact may have been built from an upload with another name, so
+        its pages are labelled with ``name``, the file's name in this request.
+        """
+        try:
+            with Artifact(self.path(document_hash)) as artifact:
+                if artifact.meta.get("embedding_model") != model:
+                    return None
+                pages = [
+                    Document(page_content=text, metadata={**metadata, "source": name})
+                    for text, metadata in zip(artifact.texts(), artifact.section("page_metadata"))
+                ]
+                spans = artifact.array("chunk_spans").tolist()
+                vectors = artifact.array("embeddings").astype("float32")
+        except (FileNotFoundError, ArtifactError):
+            return None
+        return {
+            "name": name,
+            "texts": [pages[page].page_content[start:end] for page, start, end in spans],
+            "vectors": vectors,
+            "metadatas": [pages[page].metadata for page, _, _ in spans],
+            "pages": pages,
+        }
+
+    def _build(self, file, document_hash, model):
+        documents = load_document(file)
+        for page_number, document in enumerate(documents):
+            document.metadata.update({
+                "source": file.name,
+                "document_hash": document_hash,
+                "page": document.metadata.get("page", page_number),
+            })
+        chunks = split_documents(documents)
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = np.asarray(get_embeddings().embed_documents(texts) if texts else [], dtype="float32")
+        entry = {
+            "name": file.name,
+            "texts": texts,
+            "vectors": vectors,
+            "metadatas": [chunk.metadata for chunk in chunks],
+            "pages": documents,
+        }
+        try:
+            size = write_artifact(
+                self.path(document_hash),
+                [document.page_content for document in documents],
+                arrays={
+                    "chunk_spans": chunk_spans(documents, chunks),
+                    # A file without text (e.g. a scanned PDF) has no vectors to infer the width from
+                    "embeddings": vectors.astype("float16").reshape(len(texts), vectors.shape[-1] if texts else 0),
+                },
+                sections={"page_metadata": [document.metadata for document in documents]},
+                meta={"embedding_model": model},
+                compress=getattr(settings, "ARTIFACT_COMPRESSION", False),
+            )
+            print(f"Artifact written for {file.name}: {len(documents)} pages, {len(texts)} chunks, {size} bytes")
+        except ArtifactError as e:
+            print(f"Artifact not cached for {file.name}: {e}")
+        return entry
+
+    def ensure(self, uploads):
+        """Return a vector store over the uploads and per-file entries, building missing artifacts.
+
+        ``uploads`` is a list of (file, document_hash); each entry carries the
+        file's name, pages, chunk count and whether it came from the cache.
+        """
+        model = self._embedding_model()
+        entries = {}
+        for file, document_hash in uploads:
+            if document_hash in entries:
+                continue
+            with self._lock(document_hash):
+                entry = self._read(document_hash, model, file.name)
+                cached = entry is not None
+                if entry is None:
+                    entry = self._build(file, document_hash, model)
+            entries[document_hash] = {**entry, "cached": cached}
+
+        texts = [text for entry in entries.values() for text in entry["texts"]]
+        if not texts:
+            raise ValueError("No text could be extracted from the proposal files")
+        store = FAISS.from_embeddings(
+            list(zip(texts, [vector for entry in entries.values() for vector in entry["vectors"]])),
+            get_embeddings(),
+            metadatas=[metadata for entry in entries.values() for metadata in entry["metadatas"]],
+        )
+        return store, entries
+
+
+proposal_index_cache = ProposalIndexCache()
+
+
+def process_proposal(files, custom_questions=None, proposal_id=None, document_hashes=None):
+    """Analyze several files of one proposal with a single shared index.
+
+    Files seen before (in this or any other proposal) are loaded from their
+    cached artifacts; the question set and the decision run once over all files.
+    ``document_hashes`` are the files' content hashes when the caller already
+    computed them, so the uploads are not read twice.
+    """
+    timings = {}
+    stage_start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = round(now - stage_start, 3)
+        stage_start = now
+
+    if document_hashes is None:
+        document_hashes = [compute_file_hash(file) for file in files]
+    uploads = list(zip(files, document_hashes))
+    hashes = list(dict.fromkeys(document_hash for _, document_hash in uploads))
+    print(f"=== process_proposal START: {len(hashes)} files, proposal {proposal_id or proposal_hash(hashes)[:12]} ===")
+
+    store, entries = proposal_index_cache.ensure(uploads)
+    added = [document_hash for document_hash, entry in entries.items() if not entry["cached"]]
+    print(f"Proposal index ready: {len(added)} files added, {len(hashes) - len(added)} reused from cache")
+    lap("indexing")
+
+    # Financial facts per file and across the proposal, from cached pages
+    all_documents = [document for entry in entries.values() for document in entry["pages"]]
+    financial_facts = extract_financial_facts(all_documents)
+    file_reports = []
+    for document_hash, entry in entries.items():
+        facts = extract_financial_facts(entry["pages"])
+        file_reports.append({
+            "name": entry["name"],
+            "document_hash": document_hash,
+            "pages": len(entry["pages"]),
+            "chunks": len(entry["texts"]),
+            "cached": entry["cached"],
+            "approved_amount": facts["approved_amount"],
+            "expenditure_amount": facts["expenditure_amount"],
+            "discrepancies": facts["discrepancies"],
+        })
+    lap("extraction")
+
+    retriever = store.as_retriever(search_kwargs={"k": RETRIEVER_K})
+    qa_chains = create_qa_chains(retriever, document_prompt=DOCUMENT_PROMPT)
+
+    questions = STANDARD_QUESTIONS.copy()
+    if custom_questions:
+        questions.extend(custom_questions)
+    run_metrics = TierMetrics()
+    precomputed_answers = answer_financial_questions(financial_facts, questions)
+    early_exit = None
+    if EARLY_EXIT_ENABLED:
+        analysis_results, early_exit = analyze_document_ordered(qa_chains, questions, precomputed_answers, run_metrics)
+    else:
+        analysis_results = analyze_document(qa_chains, questions, precomputed_answers, run_metrics)
+    lap("questions")
+
+    if early_exit:
+        decision_text = early_exit_decision(early_exit)
+    else:
+        decision_text = make_decision(analysis_results, financial_facts, run_metrics)
+    status = decision_status(decision_text)
+    lap("decision")
+    timings["total"] = round(sum(timings.values()), 3)
+    print(f"=== process_proposal SUCCESS: {status} ===")
+
+    return {
+        "status": status,
+        "proposal_id": proposal_id,
+        "document_hash": proposal_hash(hashes),
+        "report": {
+            "files": file_reports,
+            "analysis": analysis_results,
+            "financial_facts": financial_facts,
+            "llm_metrics": run_metrics.snapshot(),
+            "early_exit": early_exit,
+            "decision": decision_text,
+        },
+        "timings": timings,
+    }
+
+
+def run_proposal_analysis(files, custom_questions=None, proposal_id=None, document_hashes=None):
+    """Run ``process_proposal`` and persist the run as an ``Analysis`` record."""
+    source = f"proposal {proposal_id}" if proposal_id else ", ".join(file.name for file in files)
+    q_hash = questions_hash(custom_questions)
+    if document_hashes is None:
+        document_hashes = [compute_file_hash(file) for file in files]
+    try:
+        result = process_proposal(files, custom_questions, proposal_id, document_hashes)
+    except Exception as e:
+        Analysis.objects.create(
+            document_hash=proposal_hash(document_hashes),
+            questions_hash=q_hash,
+            source=source[:255],
+            status="FAILED",
+            error=str(e),
+        )
+        raise
+
+    analysis = Analysis.objects.create(
+        document_hash=result["document_hash"],
+        questions_hash=q_hash,
+        source=source[:255],
+        status=result["status"],
+        decision=result["report"]["decision"],
+        answers=result["report"]["analysis"],
+        report=result["report"],
+        timings=result["timings"],
+    )
+    return {**result, "analysis_id": analysis.id}
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .llm import LLM_PROVIDER, DEFAULT_MODELS
+
+# Larger model used for the strong/decision tiers when no model is configured
+STRONG_DEFAULT_MODELS = {
+    "groq": "llama-3.3-70b-versatile",
+}
+
+def load_json_setting(name, default):
+    """Read a JSON setting from the environment, given inline or as a path to a JSON file."""
+    configured = os.getenv(name)
+    if not configured:
+        return default
+    if configured.lstrip().startswith(("{", "[")):
+        return json.loads(configured)
+    with open(configured, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Model tiers: cheap/fast for factual lookups, stronger for judgement calls
+MODEL_TIERS = {
+    "fast": {
+        "model": os.getenv("LLM_FAST_MODEL") or None,
+        "max_tokens": int(os.getenv("LLM_FAST_MAX_TOKENS", 512)),
+        "temperature": float(os.getenv("LLM_FAST_TEMPERATURE", 0)),
+    },
+    "standard": {
+        "model": os.getenv("LLM_STANDARD_MODEL") or None,
+        "max_tokens": int(os.getenv("LLM_STANDARD_MAX_TOKENS", 512)),
+        "temperature": float(os.getenv("LLM_STANDARD_TEMPERATURE", 0)),
+    },
+    "strong": {
+        "model": os.getenv("LLM_STRONG_MODEL") or None,
+        "max_tokens": int(os.getenv("LLM_STRONG_MAX_TOKENS", 1024)),
+        "temperature": float(os.getenv("LLM_STRONG_TEMPERATURE", 0)),
+    },
+    "decision": {
+        "model": os.getenv("LLM_DECISION_MODEL") or os.getenv("LLM_STRONG_MODEL") or None,
+        "max_tokens": int(os.getenv("LLM_DECISION_MAX_TOKENS", 1024)),
+        "temperature": float(os.getenv("LLM_DECISION_TEMPERATURE", 0.2)),
+    },
+}
+
+# Question class -> tier (LLM_CLASS_TIERS overrides, e.g. {"analysis": "strong"})
+QUESTION_CLASS_TIERS = {
+    "factual": "fast",
+    "analysis": "standard",
+    "red_flag": "strong",
+    **load_json_setting("LLM_CLASS_TIERS", {}),
+}
+
+# Standard questions by class; anything not listed (e.g. custom questions) is "analysis"
+QUESTION_CLASSES = {
+    "What is the amount of budget installment approved from government?": "factual",
+    "What are the main objectives of the project?": "factual",
+    "What is the timeline for project implementation?": "factual",
+    "What specific outcomes or deliverables are expected?": "factual",
+    "how fund is being utilized for different work, and does this match with the expenditure?": "analysis",
+    "Is there a detailed breakdown of how funds will be utilized?": "analysis",
+    "Does the project align with government priorities and policies?": "analysis",
+    "Is there evidence of proper planning and risk management?": "analysis",
+    "Is the fund released by government matches with the expenditure?": "analysis",
+    "Are there any red flags or concerns in the document?": "red_flag",
+    "is there any disperencies in fund utilization?": "red_flag",
+    # LLM_QUESTION_CLASSES adds or reclassifies questions, e.g. custom questions asked often
+    **load_json_setting("LLM_QUESTION_CLASSES", {}),
+}
+
+for _tier in QUESTION_CLASS_TIERS.values():
+    if _tier not in MODEL_TIERS:
+        raise ValueError(f"LLM_CLASS_TIERS maps to unknown tier {_tier!r}; use one of {', '.join(MODEL_TIERS)}")
+for _question, _class in QUESTION_CLASSES.items():
+    if _class not in QUESTION_CLASS_TIERS:
+        raise ValueError(f"LLM_QUESTION_CLASSES puts {_question!r} in unknown class {_class!r}")
+
+
+def tier_for_question(question):
+    return QUESTION_CLASS_TIERS[QUESTION_CLASSES.get(question, "analysis")]
+
+
+def tier_config(tier, provider=None):
+    """Return model, max_tokens and temperature for a tier with defaults resolved."""
+    provider = provider or LLM_PROVIDER
+    config = dict(MODEL_TIERS[tier])
+    if not config["model"]:
+        if tier in ("strong", "decision"):
+            config["model"] = STRONG_DEFAULT_MODELS.get(provider) or DEFAULT_MODELS.get(provider)
+        else:
+            config["model"] = DEFAULT_MODELS.get(provider)
+    return config
+
+
+class TierMetrics:
+    """Thread-safe per-tier call counts, latency and token totals."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiers = {}
+
+    def record(self, tier, model, latency, prompt_tokens, completion_tokens):
+        with self.lock:
+            stats = self.tiers.setdefault(tier, {
+                "calls": 0, "latency_total": 0.0, "latency_max": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "models": [],
+            })
+            stats["calls"] += 1
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            if model and model not in stats["models"]:
+                stats["models"].append(model)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                tier: {
+                    **stats,
+                    "models": list(stats["models"]),
+                    "latency_avg": stats["latency_total"] / stats["calls"] if stats["calls"] else 0.0,
+                }
+                for tier, stats in self.tiers.items()
+            }
+
+
+# Process-wide totals, exposed through the metrics endpoint
+llm_metrics = TierMetrics()
+
+
+class TierMetricsHandler(BaseCallbackHandler):
+    """Callback that records latency and token usage of every LLM call for one tier."""
+
+    def __init__(self, tier, model, run_metrics=None):
+        self.tier = tier
+        self.model = model
+        self.sinks = [llm_metrics] + ([run_metrics] if run_metrics is not None else [])
+        self.started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        latency = time.perf_counter() - self.started.pop(run_id, time.perf_counter())
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+        for sink in self.sinks:
+            sink.record(self.tier, self.model, latency, prompt_tokens, completion_tokens)
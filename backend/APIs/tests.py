@@ -1,3 +1,953 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from langchain.schema import Document
+from langchain_community.embeddings import FakeEmbeddings
+from rest_framework.test import APIClient
+
+from backend.admission_middleware import AdmissionControlMiddleware
+
+from .artifacts import MAGIC, Artifact, ArtifactError, write_artifact
+from .chain_indexer import EVENTS, GET_PROPOSAL_INFO, GET_STAGE_INFO, ChainIndexer, decode_abi
+from .corpus import SYNC_RESCAN_SECONDS, CorpusIndex
+from .ipfs import (
+    BlobCache, CIDError, ContentTooLarge, GatewayFetcher, LocalDirectoryFetcher, compute_cid, parse_cid, verify_cid,
+)
+from .early_exit import DEFAULT_RULES, evaluate, load_rules
+from .dedup import NearDuplicateIndex, minhash_signature
+from .extraction import (
+    APPROVED_AMOUNT_QUESTION, DISCREPANCY_QUESTION, FINANCIAL_QUESTIONS, RELEASED_VS_EXPENDITURE_QUESTION,
+    answer_financial_questions, extract_financial_facts, extract_tables,
+)
+from .routing import TierMetrics, load_json_setting, tier_for_question
+from .models import Analysis, ChainEvent, ChainProposal, ChainStage, CorpusChunk
+from .proposals import LOCK_STRIPES, ProposalIndexCache, process_proposal
+from .singleflight import SingleFlight
+from . import profiling, uploads
+from .views import decode_cursor, encode_cursor
+from .utils import STANDARD_QUESTIONS, analyze_document_ordered, load_document
+
+SAMPLE_FILES = Path(settings.BASE_DIR).parent / "files"
+
+
+def load_sample(relative_path):
+    path = SAMPLE_FILES / relative_path
+    with open(path, "rb") as f:
+        return load_document(File(f, name=path.name))
+
+
+def facts_for(text):
+    return extract_financial_facts([Document(page_content=text)])
+
+
+class ExtractionSampleTests(SimpleTestCase):
+    """Extraction over the sample proposals in files/."""
+
+    def test_stage1_table_with_labels_on_previous_line(self):
+        facts = extract_financial_facts(load_sample("proposal1/stage1 report.pdf"))
+        self.assertEqual(facts["currency"], "ETH")
+        self.assertEqual(facts["approved_amount"], 6.0)
+        self.assertEqual(facts["expenditure_amount"], 5.85)
+        table = facts["tables"][0]
+        self.assertEqual(
+            [item["label"] for item in table["line_items"]],
+            ["IoT Sensor Procurement & Installation", "Backend Infrastructure Development",
+             "Project Management & Team Setup"],
+        )
+        self.assertEqual(facts["discrepancies"], [])
+
+    def test_stage1_underspend_is_not_a_discrepancy(self):
+        facts = extract_financial_facts(load_sample("proposal1/stage1 report.pdf"))
+        answers = answer_financial_questions(facts, FINANCIAL_QUESTIONS)
+        self.assertTrue(answers[DISCREPANCY_QUESTION].startswith("No discrepancies"))
+        self.assertIn("0.15 ETH unspent", answers[RELEASED_VS_EXPENDITURE_QUESTION])
+
+    def test_stage2_rows_with_trailing_status_cells(self):
+        facts = extract_financial_facts(load_sample("proposal1/Stage 2 Report_ Application Development & Integration.pdf"))
+        self.assertEqual(facts["approved_amount"], 4.0)
+        self.assertEqual(facts["expenditure_amount"], 3.92)
+        table = facts["tables"][0]
+        self.assertEqual(len(table["line_items"]), 4)
+        self.assertEqual(table["stated_totals"], [4.0, 3.92])
+        # The only overspent line is the one the report itself marks "Over by 0.01 ETH"
+        self.assertEqual(len(facts["discrepancies"]), 1)
+        self.assertIn("Training & Public Awareness", facts["discrepancies"][0])
+
+    def test_title_totals(self):
+        self.assertEqual(extract_financial_facts(load_sample("proposal1/title.txt"))["approved_amount"], 10.0)
+        self.assertEqual(extract_financial_facts(load_sample("proposal2/title.txt"))["approved_amount"], 20.0)
+        # "Total Estimated Cost" on one line, "20 ETH" on the next
+        facts = extract_financial_facts(load_sample("proposal3/title.txt"))
+        self.assertEqual(facts["approved_amount"], 20.0)
+        self.assertEqual(facts["discrepancies"], [])
+
+    def test_unknown_amounts_are_not_guessed(self):
+        facts = extract_financial_facts(load_sample("proposal2/stage1report.pdf"))
+        self.assertIsNone(facts["approved_amount"])
+        self.assertIsNone(facts["expenditure_amount"])
+        self.assertEqual(answer_financial_questions(facts, FINANCIAL_QUESTIONS), {})
+
+
+class ExtractionTests(SimpleTestCase):
+
+    def test_line_item_is_not_taken_as_total(self):
+        facts = facts_for("Detailed Expenditure Breakdown: Hardware: 3.45 ETH\nSoftware expenditure: 1.2 ETH")
+        self.assertIsNone(facts["expenditure_amount"])
+
+    def test_overspend_is_a_discrepancy(self):
+        facts = facts_for(
+            "Item | Budget (INR) | Spent (INR) | Status\n"
+            "Labour | 1,00,000 | 90,000 | done\n"
+            "Materials | 2,00,000 | 2,50,000 | over\n"
+            "Total | 3,00,000 | 3,40,000 |"
+        )
+        self.assertEqual((facts["approved_amount"], facts["expenditure_amount"]), (300000.0, 340000.0))
+        self.assertEqual(len(facts["discrepancies"]), 2)
+        answers = answer_financial_questions(facts, FINANCIAL_QUESTIONS)
+        self.assertTrue(answers[RELEASED_VS_EXPENDITURE_QUESTION].startswith("No."))
+        self.assertTrue(answers[DISCREPANCY_QUESTION].startswith("Yes."))
+
+    def test_stated_total_mismatch(self):
+        facts = facts_for("Item  Budget  Spent\nA  10 ETH  10 ETH\nB  5 ETH  5 ETH\nTotal  15 ETH  18 ETH")
+        self.assertEqual(facts["tables"][0]["total_mismatches"][0]["computed"], 15.0)
+        self.assertEqual(facts["approved_amount"], 15.0)
+
+    def test_prose_and_bullets_are_not_tables(self):
+        text = ("● iOS development: 0.70 ETH\n● Android development: 0.70 ETH\n"
+                "The project spent a large share of the 4 ETH budget on hardware for rural schools in the region.")
+        self.assertEqual(extract_tables(text), [])
+
+    def test_scaled_amounts(self):
+        facts = facts_for("Total sanctioned amount: Rs. 2.5 crore")
+        self.assertEqual(facts["approved_amount"], 2.5e7)
+        self.assertEqual(facts["currency"], "INR")
+        self.assertIn(APPROVED_AMOUNT_QUESTION, answer_financial_questions(facts, FINANCIAL_QUESTIONS))
+
+
+RED_FLAG_QUESTION = "Are there any red flags or concerns in the document?"
+
+
+class EarlyExitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.rules = load_rules()
+
+    def decision(self, answer, question=RED_FLAG_QUESTION):
+        result = evaluate(question, answer, self.rules)
+        return result and result["decision"]
+
+    def test_rules(self):
+        self.assertEqual(len(self.rules), len(DEFAULT_RULES))
+        self.assertEqual(self.decision("The contractor diverted funds to a private account."), "REJECTED")
+        self.assertEqual(self.decision("Yes, the invoices for Phase 2 were falsified."), "REJECTED")
+        self.assertEqual(self.decision("The report shows evidence of misappropriation."), "REJECTED")
+        self.assertEqual(self.decision("There are indications of possible fraud in vendor payments."), "REVIEW")
+        self.assertEqual(self.decision("Travel receipts may have been inflated."), "REVIEW")
+        self.assertEqual(self.decision("Yes, there are significant discrepancies in the travel costs."), "REVIEW")
+        self.assertIsNone(self.decision("Yes. The report is complete."))
+        self.assertIsNone(self.decision("Yes, there are no red flags in the document."))
+        self.assertIsNone(self.decision("There is no evidence of fraud."))
+
+    def test_safeguards_are_not_findings(self):
+        for answer in (
+            "The project includes fraud detection and anti-embezzlement audit measures.",
+            "The budget sets aside safeguards to prevent misappropriation of funds.",
+            "The document mentions a fraud hotline for beneficiaries.",
+            "Yes, the plan describes fraud prevention controls.",
+            "Funds are protected against embezzlement by quarterly audits.",
+        ):
+            with self.subTest(answer):
+                self.assertIsNone(self.decision(answer))
+        self.assertIsNone(self.decision("Fraud controls are described.", "What are the main objectives of the project?"))
+
+    def run_ordered(self, facts, answer):
+        precomputed = answer_financial_questions(facts, STANDARD_QUESTIONS)
+        with mock.patch("APIs.utils.answer_question", side_effect=lambda chains, question, metrics: answer) as ask:
+            results, early_exit = analyze_document_ordered({}, STANDARD_QUESTIONS, precomputed, rules=self.rules)
+        return precomputed, results, early_exit, ask.call_count
+
+    def test_differing_amounts_do_not_exit_early(self):
+        over = "Item | Budget (INR) | Spent (INR)\nLabour | 1,00,000 | 1,40,000\nTotal | 1,00,000 | 1,40,000"
+        under = "Item | Budget (INR) | Spent (INR)\nLabour | 1,00,000 | 60,000\nTotal | 1,00,000 | 60,000"
+        for text, discrepancy in ((over, "Yes."), (under, "No discrepancies")):
+            precomputed, results, early_exit, calls = self.run_ordered(facts_for(text), "No red flags were found.")
+            self.assertTrue(precomputed[DISCREPANCY_QUESTION].startswith(discrepancy))
+            self.assertIsNone(early_exit)
+            self.assertEqual(calls, len(STANDARD_QUESTIONS) - len(precomputed))
+            self.assertEqual([r["Question"] for r in results], STANDARD_QUESTIONS)
+
+    def test_llm_red_flag_ends_the_run(self):
+        facts = facts_for("Item | Budget (INR) | Spent (INR)\nLabour | 1,00,000 | 1,40,000\nTotal | 1,00,000 | 1,40,000")
+        answer = "Yes, there are concerns: invoices appear falsified."
+        precomputed, results, early_exit, calls = self.run_ordered(facts, answer)
+        self.assertEqual(early_exit["decision"], "REJECTED")
+        self.assertEqual(early_exit["evidence"], "Yes, there are concerns: invoices appear falsified")
+        self.assertEqual(calls, 1)
+        self.assertEqual(len(early_exit["skipped_questions"]), len(STANDARD_QUESTIONS) - len(precomputed) - 1)
+        self.assertEqual(len(results), len(precomputed) + 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "report"
+
+        def caller():
+            results.append(flight.do("doc", work))
+
+        leader = threading.Thread(target=caller)
+        leader.start()
+        started.wait(5)
+        done, waiting = flight.calls["doc"].done, threading.Semaphore(0)
+        wait = done.wait
+
+        def counted_wait(timeout=None):
+            waiting.release()
+            return wait(timeout)
+
+        done.wait = counted_wait
+        followers = [threading.Thread(target=caller) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        for _ in followers:
+            self.assertTrue(waiting.acquire(timeout=5))
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("report", False)] + [("report", True)] * 3)
+        self.assertEqual(flight.calls, {})
+
+    def test_errors_propagate_and_are_not_cached(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flight.do("doc", fail)
+        self.assertEqual(flight.do("doc", lambda: "retry"), ("retry", False))
+
+    def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), (1, False))
+        self.assertEqual(flight.do("b", lambda: 2), (2, False))
+
+
+class RoutingTests(SimpleTestCase):
+
+    def test_questions_route_by_class(self):
+        self.assertEqual(tier_for_question("What are the main objectives of the project?"), "fast")
+        self.assertEqual(tier_for_question("Are there any red flags or concerns in the document?"), "strong")
+        self.assertEqual(tier_for_question("A custom question?"), "standard")
+
+    def test_json_setting_inline_or_file(self):
+        with mock.patch.dict(os.environ, {"ROUTING_TEST": '{"Q?": "red_flag"}'}):
+            self.assertEqual(load_json_setting("ROUTING_TEST", {}), {"Q?": "red_flag"})
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"analysis": "strong"}, f)
+        self.addCleanup(os.unlink, f.name)
+        with mock.patch.dict(os.environ, {"ROUTING_TEST": f.name}):
+            self.assertEqual(load_json_setting("ROUTING_TEST", {}), {"analysis": "strong"})
+        self.assertEqual(load_json_setting("ROUTING_TEST_UNSET", {"a": 1}), {"a": 1})
+
+    def test_tier_metrics(self):
+        metrics = TierMetrics()
+        metrics.record("fast", "m", 1.0, 10, 5)
+        metrics.record("fast", "m", 3.0, 20, 5)
+        stats = metrics.snapshot()["fast"]
+        self.assertEqual((stats["calls"], stats["prompt_tokens"], stats["latency_max"]), (2, 30, 3.0))
+        self.assertEqual(stats["latency_avg"], 2.0)
+
+
+def unit_vectors(seed, n, dim=16):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+
+
+class CorpusIndexTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_search_finds_added_documents(self):
+        index = CorpusIndex(self.directory)
+        index.add("a", "a.pdf", ["a0", "a1"], unit_vectors(1, 2))
+        index.add("b", "b.pdf", ["b0", "b1"], unit_vectors(2, 2))
+        results = index.search(unit_vectors(2, 1), k=2)
+        self.assertEqual(results[0]["document_hash"], "b")
+        self.assertEqual(index.add("a", "a.pdf", ["a0"], unit_vectors(1, 1)), 0)
+        self.assertEqual(index.stats()["chunks"], 4)
+
+    def test_workers_see_each_others_chunks(self):
+        first, second = CorpusIndex(self.directory), CorpusIndex(self.directory)
+        first.add("a", "a.pdf", ["a0"], unit_vectors(1, 1))
+        second.add("b", "b.pdf", ["b0"], unit_vectors(2, 1))
+        first.add("c", "c.pdf", ["c0"], unit_vectors(3, 1))
+        for index in (first, second):
+            self.assertEqual(index.search(unit_vectors(2, 1), k=1)[0]["document_hash"], "b")
+            self.assertEqual(index.index.ntotal, 3)
+
+    def test_new_process_loads_snapshot_and_catches_up(self):
+        first = CorpusIndex(self.directory)
+        first.add("a", "a.pdf", ["a0", "a1"], unit_vectors(1, 2))  # first add rebuilds and snapshots
+        first.add("b", "b.pdf", ["b0"], unit_vectors(2, 1))  # below SNAPSHOT_EVERY, only in memory
+        fresh = CorpusIndex(self.directory)
+        self.assertEqual(fresh.stats()["indexed_vectors"], 3)
+        self.assertEqual(fresh.search(unit_vectors(2, 1), k=1)[0]["document_hash"], "b")
+
+    def test_search_reads_only_new_chunks_until_rescan(self):
+        index = CorpusIndex(self.directory)
+        index.add("a", "a.pdf", ["a0"], unit_vectors(1, 1))
+
+        def commit(chunk_id, document_hash):
+            CorpusChunk.objects.create(
+                id=chunk_id, document_hash=document_hash, source=f"{document_hash}.pdf", chunk_index=0,
+                text=document_hash, embedding=unit_vectors(chunk_id, 1)[0].tobytes(),
+            )
+
+        commit(index.synced_id + 100, "b")
+        with self.assertNumQueries(1):
+            index._sync()
+        # A chunk whose transaction committed after a higher id was indexed
+        commit(index.synced_id - 50, "late")
+        with self.assertNumQueries(1):
+            index._sync()
+        self.assertEqual(index.index.ntotal, 2)
+        with mock.patch("APIs.corpus.time.monotonic", return_value=index.rescanned_at + SYNC_RESCAN_SECONDS):
+            index._sync()
+        self.assertEqual(index.index.ntotal, 3)
+
+    def test_removed_documents_are_not_returned(self):
+        first, second = CorpusIndex(self.directory), CorpusIndex(self.directory)
+        first.add("a", "a.pdf", ["a0"], unit_vectors(1, 1))
+        first.add("b", "b.pdf", ["b0"], unit_vectors(2, 1))
+        second.stats()
+        self.assertEqual(first.remove_document("b"), 1)
+        self.assertNotIn("b", [doc["document_hash"] for doc in second.search(unit_vectors(2, 1), k=2)])
+
+    def test_search_rejects_invalid_k(self):
+        client = APIClient()
+        for k in ("0", "-3", "five", "2.5", "1000"):
+            with self.subTest(k=k), mock.patch("APIs.corpus.corpus_index.search") as search:
+                response = client.post("/similar/", {"text": "budget", "k": k})
+                self.assertEqual(response.status_code, 400)
+                search.assert_not_called()
+
+    def test_delete_requires_staff(self):
+        client = APIClient()
+        response = client.delete("/similar/?document_hash=a")
+        self.assertIn(response.status_code, (401, 403))
+        admin = User.objects.create_user("admin", password="x", is_staff=True)
+        client.force_authenticate(admin)
+        with mock.patch("APIs.corpus.corpus_index", CorpusIndex(self.directory)):
+            response = client.delete("/similar/?document_hash=a")
+        self.assertEqual(response.json(), {"removed_chunks": 0})
+
+
+PROPOSAL_TEXT = (
+    "Development of a comprehensive smart city digital infrastructure system for Metro City including IoT "
+    "sensors, data analytics platform, and citizen mobile application. This project aims to improve traffic "
+    "management, waste collection efficiency, and emergency response times while providing real-time city "
+    "data to residents. Total Budget: 10 ETH"
+)
+
+
+class NearDuplicateTests(TestCase):
+
+    def test_text_less_documents_get_no_signature(self):
+        self.assertIsNone(minhash_signature(""))
+        self.assertIsNone(minhash_signature("   \n\t "))
+        self.assertIsNone(minhash_signature("Page 1 Page 2"))
+
+    def test_near_duplicates_are_found(self):
+        index = NearDuplicateIndex()
+        index.add("original", "a.txt", minhash_signature(PROPOSAL_TEXT))
+        edited = PROPOSAL_TEXT.replace("Metro City", "Metro Town")
+        matches = index.find(minhash_signature(edited), threshold=0.5)
+        self.assertEqual([m["document_hash"] for m in matches], ["original"])
+        unrelated = " ".join(f"word{i}" for i in range(60))
+        self.assertEqual(index.find(minhash_signature(unrelated), threshold=0.5), [])
+
+    def test_reuse_requires_same_figures(self):
+        index = NearDuplicateIndex()
+        Analysis.objects.create(
+            document_hash="original", questions_hash="q", source="a.txt", status="APPROVED",
+            report={"financial_facts": {"currency": "ETH", "approved_amount": 10.0, "expenditure_amount": None}},
+        )
+        matches = [{"document_hash": "original", "source": "a.txt", "similarity": 0.95}]
+        same = {"currency": "ETH", "approved_amount": 10.0, "expenditure_amount": None}
+        self.assertIsNotNone(index.reusable_analysis(matches, "q", same)[1])
+        changed = {**same, "approved_amount": 15.0}
+        self.assertEqual(index.reusable_analysis(matches, "q", changed), (None, None))
+        self.assertEqual(index.reusable_analysis(matches, "other-questions", same), (None, None))
+
+
+class AnalysisPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(5):
+            Analysis.objects.create(document_hash=f"doc{i}", source=f"doc{i}.pdf", status="APPROVED")
+        # Ties on created_at are broken by id
+        Analysis.objects.filter(document_hash__in=["doc1", "doc2", "doc3"]).update(created_at=timezone.now())
+
+    def test_cursor_round_trip(self):
+        analysis = Analysis.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(analysis)), (analysis.created_at, analysis.id))
+
+    def test_pages_cover_every_analysis_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get("/analyses/", {"limit": 2, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(result["id"] for result in response.json()["results"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+        expected = list(Analysis.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        for cursor in ("not base64!", base64.urlsafe_b64encode(b"no-separator").decode()):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+            self.assertEqual(self.client.get("/analyses/", {"cursor": cursor}).status_code, 400)
+
+    def test_filters(self):
+        Analysis.objects.create(document_hash="bad", source="bad.pdf", status="REJECTED")
+        results = self.client.get("/analyses/", {"status": "rejected"}).json()["results"]
+        self.assertEqual([result["document_hash"] for result in results], ["bad"])
+
+
+def encode_abi(types, values):
+    """ABI-encode the static and string types decoded by ``decode_abi``."""
+    head, tail = [], b""
+    for abi_type, value in zip(types, values):
+        if abi_type == "string":
+            data = value.encode()
+            head.append((32 * len(types) + len(tail)).to_bytes(32, "big"))
+            tail += len(data).to_bytes(32, "big") + data.ljust((len(data) + 31) // 32 * 32, b"\0")
+        elif abi_type == "address":
+            head.append(bytes.fromhex(value[2:]).rjust(32, b"\0"))
+        else:
+            head.append(int(value).to_bytes(32, "big"))
+    return "0x" + (b"".join(head) + tail).hex()
+
+
+TOPICS = {name: topic for topic, (name, _, _) in EVENTS.items()}
+CREATOR = "0x" + "ab" * 20
+RECIPIENT = "0x" + "cd" * 20
+
+
+class FakeRpc:
+    """Serves logs and contract calls for one proposal with two 5 ETH stages."""
+
+    def __init__(self, logs):
+        self.logs = logs
+
+    def block_number(self):
+        return max(int(log["blockNumber"], 16) for log in self.logs)
+
+    def get_logs(self, address, from_block, to_block):
+        return [log for log in self.logs if from_block <= int(log["blockNumber"], 16) <= to_block]
+
+    def eth_call(self, address, data, block="latest"):
+        if data.startswith(GET_PROPOSAL_INFO):
+            return encode_abi(["string", "address", "uint256", "uint8"] + ["uint256"] * 7,
+                              ["Smart city", RECIPIENT, 10 * 10**18, 1, 0, 0, 0, 0, 0, 0, 2])
+        if data.startswith(GET_STAGE_INFO):
+            return encode_abi(["uint256", "string", "string", "uint256", "uint8"], [5 * 10**18, "", "", 0, 0])
+        raise AssertionError(data)
+
+
+def chain_log(block, index, name, types, values):
+    return {
+        "blockNumber": hex(block), "logIndex": hex(index), "transactionHash": f"0x{block:064x}",
+        "topics": [TOPICS[name]], "data": encode_abi(types, values),
+    }
+
+
+class ChainIndexerTests(TestCase):
+
+    def setUp(self):
+        self.logs = [
+            chain_log(1, 0, "ProposalCreated", ["uint256", "address", "uint256"], [1, CREATOR, 10 * 10**18]),
+            chain_log(2, 0, "AuthorityVoted", ["uint256", "address", "bool"], [1, CREATOR, True]),
+            chain_log(3, 0, "PublicVoted", ["uint256", "address", "bool", "string"], [1, RECIPIENT, False, "Too costly"]),
+            chain_log(4, 0, "ProposalApproved", ["uint256"], [1]),
+            chain_log(5, 0, "StageAmountReleased", ["uint256", "uint256", "uint256"], [1, 0, 5 * 10**18]),
+            chain_log(6, 0, "StageReportSubmitted", ["uint256", "uint256", "string"], [1, 0, "ipfs://report"]),
+        ]
+        self.indexer = ChainIndexer(contract_address="0x" + "11" * 20, batch_size=2)
+        self.indexer.rpc = FakeRpc(self.logs)
+
+    def test_decode_abi(self):
+        values = decode_abi(["uint256", "address", "bool", "string"],
+                            encode_abi(["uint256", "address", "bool", "string"], [7, CREATOR, True, "héllo"]))
+        self.assertEqual(values, [7, CREATOR, True, "héllo"])
+
+    def test_events_fold_into_proposal_state(self):
+        self.assertEqual(self.indexer.sync(), len(self.logs))
+        proposal = ChainProposal.objects.get(proposal_id=1)
+        self.assertEqual((proposal.creator, proposal.recipient, proposal.description), (CREATOR, RECIPIENT, "Smart city"))
+        self.assertEqual((proposal.authority_yes_votes, proposal.public_no_votes), (1, 1))
+        self.assertEqual(proposal.state, 5)  # InProgress
+        stage = ChainStage.objects.get(proposal=proposal, stage_number=0)
+        self.assertEqual((int(stage.released_amount), stage.report), (5 * 10**18, "ipfs://report"))
+        self.assertEqual(ChainEvent.objects.get(name="PublicVoted").args["comment"], "Too costly")
+
+    def test_resync_is_idempotent(self):
+        self.indexer.sync()
+        self.indexer.rpc.logs = self.logs + [chain_log(7, 0, "StageApproved", ["uint256", "uint256"], [1, 0])]
+        self.assertEqual(self.indexer.sync(), 1)
+        # Replaying already ingested logs changes nothing
+        self.assertEqual(sum(self.indexer.apply_log(log, 7) for log in self.logs), 0)
+        self.assertEqual(ChainProposal.objects.get(proposal_id=1).authority_yes_votes, 1)
+        self.assertEqual(ChainEvent.objects.count(), len(self.logs) + 1)
+
+
+class FakeResponse:
+    """Streaming response stand-in that records how much of the body was read."""
+
+    def __init__(self, body, headers=None):
+        self.body, self.headers, self.read = body, headers or {}, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            self.read += min(size, len(self.body) - start)
+            yield self.body[start:start + size]
+
+
+class IPFSTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_known_cids(self):
+        # `ipfs add` of "hello world\n" (CIDv0) and of "hello world" with --cid-version 1 --raw-leaves
+        self.assertEqual(compute_cid(b"hello world\n"), "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o")
+        self.assertEqual(compute_cid(b"hello world", version=1),
+                         "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e")
+
+    def test_multi_block_round_trip(self):
+        content = os.urandom(3 * 256 * 1024 + 10)
+        for version in (0, 1):
+            cid = compute_cid(content, version)
+            self.assertEqual(parse_cid(cid)[0], version)
+            self.assertTrue(verify_cid(cid, content))
+            self.assertFalse(verify_cid(cid, content[:-1]))
+
+    def test_malformed_cids(self):
+        for cid in ("", "Qm123", "bnotbase32!", "zdj7W"):
+            with self.assertRaises(CIDError):
+                parse_cid(cid)
+
+    def test_cache_verifies_content(self):
+        gateway = LocalDirectoryFetcher(Path(self.directory) / "gateway")
+        cid = gateway.add(b"stage report")
+        cache = BlobCache(Path(self.directory) / "cache", fetcher=gateway)
+        self.assertEqual(cache.get(cid), (b"stage report", False))
+        self.assertEqual(cache.get(cid), (b"stage report", True))
+        (Path(self.directory) / "gateway" / compute_cid(b"other")).write_bytes(b"tampered")
+        with self.assertRaises(CIDError):
+            BlobCache(Path(self.directory) / "cache2", fetcher=gateway).get(compute_cid(b"other"))
+
+    def test_gateway_rejects_large_content_length(self):
+        response = FakeResponse(b"x" * 100, {"Content-Length": "100"})
+        with mock.patch("APIs.ipfs.requests.get", return_value=response):
+            with self.assertRaises(ContentTooLarge):
+                GatewayFetcher("http://gateway", max_bytes=50).fetch("cid")
+        self.assertEqual(response.read, 0)
+
+    def test_gateway_stops_reading_past_the_limit(self):
+        response = FakeResponse(b"x" * (10 * 256 * 1024))  # no Content-Length
+        with mock.patch("APIs.ipfs.requests.get", return_value=response) as get:
+            with self.assertRaises(ContentTooLarge):
+                GatewayFetcher("http://gateway", max_bytes=300 * 1024).fetch("cid")
+        self.assertTrue(get.call_args.kwargs["stream"])
+        self.assertEqual(response.read, 2 * 256 * 1024)
+        with mock.patch("APIs.ipfs.requests.get", return_value=FakeResponse(b"small")):
+            self.assertEqual(GatewayFetcher("http://gateway", max_bytes=300 * 1024).fetch("cid"), b"small")
+
+
+class ArtifactTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_round_trip(self):
+        vectors = unit_vectors(1, 3).astype("float16")
+        for compress in (False, True):
+            path = self.directory / f"doc-{compress}.pfa"
+            write_artifact(
+                path, ["first page", "", "third page \u20b9"],
+                arrays={"embeddings": vectors},
+                sections={"page_metadata": [{"page": 0}, {"page": 1}, {"page": 2}]},
+                meta={"embedding_model": "test"},
+                compress=compress,
+            )
+            with Artifact(path) as artifact:
+                self.assertEqual(artifact.texts(), ["first page", "", "third page \u20b9"])
+                np.testing.assert_array_equal(artifact.array("embeddings"), vectors)
+                self.assertEqual(artifact.section("page_metadata")[2], {"page": 2})
+                self.assertEqual(artifact.meta, {"embedding_model": "test"})
+                self.assertIsNone(artifact.section("missing"))
+
+    def test_corrupt_files_raise_artifact_error(self):
+        valid = self.directory / "valid.pfa"
+        write_artifact(valid, ["text"], arrays={"embeddings": unit_vectors(1, 1)})
+        data = valid.read_bytes()
+        corrupt = {
+            "empty": b"",
+            "not an artifact": b"%PDF-1.7 ...",
+            "short header": MAGIC + b"\x01",
+            "bad header": MAGIC + struct.pack("<I", 5) + b"{nope",
+            "truncated": data[:len(data) - 8],
+        }
+        for name, content in corrupt.items():
+            path = self.directory / f"{name}.pfa"
+            path.write_bytes(content)
+            with self.subTest(name), self.assertRaises(ArtifactError):
+                Artifact(path)
+
+    def test_proposal_cache_rebuilds_corrupt_artifact(self):
+        cache = ProposalIndexCache(self.directory)
+        cache.path("ab" * 32).write_bytes(b"")
+        path = SAMPLE_FILES / "proposal1/title.txt"
+        with open(path, "rb") as f, \
+                mock.patch("APIs.proposals.get_embeddings", return_value=FakeEmbeddings(size=16)):
+            _, entries = cache.ensure([(File(f, name=path.name), "ab" * 32)])
+        self.assertFalse(entries["ab" * 32]["cached"])
+        with Artifact(cache.path("ab" * 32)) as artifact:
+            self.assertTrue(artifact.texts())
+
+
+
+class ProposalIndexCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch("APIs.proposals.get_embeddings", return_value=FakeEmbeddings(size=16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, relative_path):
+        path = SAMPLE_FILES / relative_path
+        handle = open(path, "rb")
+        self.addCleanup(handle.close)
+        return File(handle, name=path.name)
+
+    def test_second_ensure_reads_the_artifact(self):
+        cache = ProposalIndexCache(self.directory)
+        file = self.upload("proposal1/title.txt")
+        _, entries = cache.ensure([(file, "ab" * 32)])
+        self.assertFalse(entries["ab" * 32]["cached"])
+        fresh = ProposalIndexCache(self.directory)
+        with mock.patch.object(fresh, "_build") as build:
+            _, entries = fresh.ensure([(file, "ab" * 32)])
+        build.assert_not_called()
+        self.assertTrue(entries["ab" * 32]["cached"])
+        self.assertTrue(entries["ab" * 32]["texts"])
+
+    def test_cached_file_takes_the_current_name(self):
+        file = self.upload("proposal1/title.txt")
+        ProposalIndexCache(self.directory).ensure([(file, "ab" * 32)])
+        renamed = File(file.file, name="resubmitted.txt")
+        store, entries = ProposalIndexCache(self.directory).ensure([(renamed, "ab" * 32)])
+        self.assertEqual(entries["ab" * 32]["name"], "resubmitted.txt")
+        self.assertEqual({doc.metadata["source"] for doc in store.docstore._dict.values()}, {"resubmitted.txt"})
+
+    def test_file_without_text_is_indexed_empty(self):
+        blank = File(tempfile.TemporaryFile(), name="scanned.txt")
+        self.addCleanup(blank.close)
+        for cache in (ProposalIndexCache(self.directory), ProposalIndexCache(self.directory)):
+            _, entries = cache.ensure([(self.upload("proposal1/title.txt"), "ab" * 32), (blank, "cd" * 32)])
+            self.assertEqual(entries["cd" * 32]["texts"], [])
+        self.assertTrue(entries["cd" * 32]["cached"])
+
+    def test_locks_are_bounded(self):
+        cache = ProposalIndexCache(self.directory)
+        keys = [hashlib.sha256(str(n).encode()).hexdigest() for n in range(10 * LOCK_STRIPES)]
+        locks = {id(cache._lock(key)) for key in keys}
+        self.assertEqual(len(locks), LOCK_STRIPES)
+        self.assertIs(cache._lock("ab" * 32), cache._lock("ab" * 32))
+
+    def test_given_hashes_are_not_recomputed(self):
+        file = self.upload("proposal1/title.txt")
+        with mock.patch("APIs.proposals.proposal_index_cache", ProposalIndexCache(self.directory)), \
+                mock.patch("APIs.proposals.compute_file_hash") as compute, \
+                mock.patch("APIs.proposals.create_qa_chains", return_value={}), \
+                mock.patch("APIs.proposals.analyze_document", return_value=[]), \
+                mock.patch("APIs.proposals.analyze_document_ordered", return_value=([], None)), \
+                mock.patch("APIs.proposals.make_decision", return_value="Decision: APPROVE"):
+            result = process_proposal([file], document_hashes=["cd" * 32])
+        compute.assert_not_called()
+        self.assertEqual(result["report"]["files"][0]["document_hash"], "cd" * 32)
+
+
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(UPLOAD_DIR=Path(self.directory))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.pdf = (SAMPLE_FILES / "proposal1/Stage 2 Report_ Application Development & Integration.pdf").read_bytes()
+
+    def send(self, upload_id, offset, data):
+        return self.client.post(
+            f"/uploads/{upload_id}/chunks/",
+            {"offset": offset, "chunk": SimpleUploadedFile("chunk", data)},
+            format="multipart",
+        )
+
+    def test_pages_are_extracted_incrementally(self):
+        import pypdf
+
+        path = Path(self.directory) / "partial.pdf"
+        path.write_bytes(b"")
+        state, pages = {}, {}
+        extract_text = pypdf.PageObject.extract_text
+        with mock.patch.object(pypdf.PageObject, "extract_text", autospec=True, side_effect=extract_text) as extract:
+            for offset in range(0, len(self.pdf), 8 * 1024):
+                with open(path, "ab") as f:
+                    f.write(self.pdf[offset:offset + 8 * 1024])
+                pages.update(uploads.extract_available_pages(path, state))
+        self.assertEqual(state["scanned"], self.pdf.rfind(b"endobj") + len(b"endobj"))
+        self.assertEqual(uploads.extract_available_pages(path, state), {})
+
+        reader = pypdf.PdfReader(str(path))
+        expected = {page.indirect_reference.idnum: page.extract_text() for page in reader.pages}
+        self.assertEqual(pages, expected)
+        # Each page is parsed once it is complete, not again on every later chunk
+        self.assertEqual(extract.call_count, len(expected))
+
+    def test_upload_round_trip(self):
+        upload_id = self.client.post("/uploads/", {"filename": "report.pdf", "size": len(self.pdf)}).json()["upload_id"]
+        self.assertEqual(self.send(upload_id, 0, self.pdf[:50000]).json()["offset"], 50000)
+        response = self.send(upload_id, 0, self.pdf[:50000])
+        self.assertEqual((response.status_code, response.json()["offset"]), (409, 50000))
+        self.send(upload_id, 50000, self.pdf[50000:])
+        uploads.page_extractor.wait(uploads.get_upload(upload_id).id)
+
+        response = self.client.post(f"/uploads/{upload_id}/complete/", {"sha256": hashlib.sha256(self.pdf).hexdigest()})
+        self.assertEqual(response.json()["pages"], 7)
+        self.assertEqual(response.json()["status"], "COMPLETE")
+
+        seen = {}
+
+        def run_analysis(file, custom_questions, document_hash, force=False, documents=None):
+            seen["file"] = file
+            return {"status": "REVIEW", "document_hash": document_hash, "pages": len(documents)}
+
+        with mock.patch("APIs.views.run_analysis", side_effect=run_analysis):
+            response = self.client.post("/analyze/", {"upload_id": upload_id})
+        self.assertEqual(response.json()["pages"], 7)
+        self.assertTrue(seen["file"].closed)
+
+    def test_malformed_upload_id(self):
+        self.assertIsNone(uploads.get_upload("not-a-uuid"))
+        response = self.client.post("/analyze/", {"upload_id": "not-a-uuid"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_complete_holds_the_upload_lock(self):
+        session = uploads.create_upload("notes.txt")
+        uploads.append_chunk(session.id, 0, SimpleUploadedFile("chunk", b"some notes"))
+        lock = uploads._upload_lock(session.id)
+        complete = uploads._complete
+
+        def locked_complete(*args):
+            self.assertTrue(lock.is_locked)
+            return complete(*args)
+
+        with mock.patch("APIs.uploads._upload_lock", return_value=lock), \
+                mock.patch("APIs.uploads._complete", side_effect=locked_complete) as completed:
+            uploads.complete_upload(session.id)
+        completed.assert_called_once()
+        self.assertFalse(lock.is_locked)
+        self.assertEqual(uploads.get_upload(session.id).status, "COMPLETE")
+
+    def test_expired_uploads_drop_their_hasher(self):
+        session = uploads.create_upload("notes.txt")
+        uploads.append_chunk(session.id, 0, SimpleUploadedFile("chunk", b"some notes"))
+        self.assertIn(session.id, uploads._hashers)
+        uploads.UploadSession.objects.filter(pk=session.id).update(updated_at=timezone.now() - timedelta(days=2))
+        uploads.prune_uploads()
+        self.assertNotIn(session.id, uploads._hashers)
+        self.assertFalse(uploads.part_path(session.id).exists())
+
+    def test_offset_is_enforced_by_the_update(self):
+        session = uploads.create_upload("notes.txt")
+        uploads.append_chunk(session.id, 0, SimpleUploadedFile("chunk", b"first "))
+        hasher = uploads._hasher
+
+        def concurrent_append(session):
+            # Another request records a chunk between the offset check and the update
+            uploads.UploadSession.objects.filter(pk=session.id).update(received=session.received + 3)
+            return hasher(session)
+
+        with mock.patch("APIs.uploads._hasher", side_effect=concurrent_append):
+            with self.assertRaises(uploads.OffsetMismatch) as raised:
+                uploads.append_chunk(session.id, 6, SimpleUploadedFile("chunk", b"second"))
+        self.assertEqual(raised.exception.expected, 9)
+        self.assertEqual(uploads.part_path(session.id).read_bytes(), b"first ")
+
+
+@override_settings(
+    ADMISSION_CONTROLLED_PATHS=["/analyze/"], ANALYSIS_MAX_INFLIGHT=1, ANALYSIS_MAX_WAITING=1,
+    ANALYSIS_QUEUE_TIMEOUT=0.05, ANALYSIS_MAX_RSS_MB=None, ANALYSIS_RETRY_AFTER=7.5,
+)
+class AdmissionControlTests(SimpleTestCase):
+
+    def setUp(self):
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        self.factory = RequestFactory()
+
+    def assertRejected(self, response, reason):
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "8")
+        self.assertIn(reason, json.loads(response.content)["error"])
+
+    def test_admits_and_releases_the_slot(self):
+        for _ in range(3):
+            self.assertEqual(self.middleware(self.factory.post("/analyze/")).status_code, 200)
+        self.assertTrue(self.middleware.slots.acquire(blocking=False))
+
+    def test_full_queue_is_rejected(self):
+        self.middleware.slots.acquire()
+        self.middleware.waiting = 1
+        self.assertRejected(self.middleware(self.factory.post("/analyze/")), "Too many analyses queued")
+        self.assertEqual(self.middleware.waiting, 1)
+
+    def test_queue_wait_times_out(self):
+        self.middleware.slots.acquire()
+        self.assertRejected(self.middleware(self.factory.post("/analyze/")), "Too many analyses in progress")
+        self.assertEqual(self.middleware.waiting, 0)
+
+    def test_waiting_request_gets_a_freed_slot(self):
+        self.middleware.slots.acquire()
+        self.middleware.queue_timeout = 5
+        threading.Timer(0.05, self.middleware.slots.release).start()
+        self.assertEqual(self.middleware(self.factory.post("/analyze/")).status_code, 200)
+
+    def test_rss_above_limit_is_rejected(self):
+        self.middleware.max_rss_mb = 100
+        with mock.patch("backend.admission_middleware.current_rss_mb", return_value=250.0):
+            self.assertRejected(self.middleware(self.factory.post("/analyze/")), "memory is under pressure")
+        with mock.patch("backend.admission_middleware.current_rss_mb", return_value=50.0):
+            self.assertEqual(self.middleware(self.factory.post("/analyze/")).status_code, 200)
+
+    def test_other_requests_pass_through(self):
+        self.middleware.slots.acquire()
+        self.middleware.waiting = 1
+        self.assertEqual(self.middleware(self.factory.get("/analyze/")).status_code, 200)
+        self.assertEqual(self.middleware(self.factory.post("/uploads/")).status_code, 200)
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(PROFILE_DIR=Path(self.directory), PROFILE_TOKEN="secret", PROFILE_ANALYSES="")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("user", password="x")
+        self.admin = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def mode(self, user=None, **headers):
+        request = self.factory.post("/analyze/", headers=headers)
+        request.user = user or mock.Mock(is_staff=False)
+        return profiling.requested_mode(request)
+
+    def test_only_staff_or_token_holders_can_profile(self):
+        self.assertIsNone(self.mode(X_Profile="1"))
+        self.assertIsNone(self.mode(self.user, X_Profile="cprofile"))
+        self.assertIsNone(self.mode(self.user, X_Profile="cprofile", X_Profile_Token="wrong"))
+        self.assertEqual(self.mode(self.user, X_Profile="cprofile", X_Profile_Token="secret"), "cprofile")
+        self.assertEqual(self.mode(self.admin, X_Profile="1"), "sample")
+        self.assertIsNone(self.mode(self.admin, X_Profile="bogus"))
+
+    def test_regular_user_header_does_not_profile_analysis(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = SimpleUploadedFile("notes.txt", b"notes")
+        with mock.patch("APIs.views.run_analysis", return_value={"status": "REVIEW"}), \
+                mock.patch("APIs.views.profiling.profile") as profile:
+            response = client.post("/analyze/", {"file": upload}, HTTP_X_PROFILE="cprofile")
+        self.assertEqual(response.status_code, 200)
+        profile.assert_not_called()
+        self.assertNotIn("profile_id", response.json())
+
+    def test_artifact_paths_reject_traversal(self):
+        with profiling.profile("cprofile", source="test") as run:
+            sum(range(1000))
+        self.assertEqual(profiling.artifact_path(run.id, "txt"), Path(self.directory) / f"{run.id}.txt")
+        for profile_id, artifact in (
+            ("../../etc/passwd", "txt"),
+            (run.id + "/..", "txt"),
+            (run.id, "../../settings.py"),
+            (run.id, "json"),
+            ("0" * 32, "txt"),
+        ):
+            with self.subTest(profile_id=profile_id, artifact=artifact):
+                self.assertIsNone(profiling.artifact_path(profile_id, artifact))
+        self.assertIsNone(profiling.get_profile("../" + run.id))
+
+    def test_endpoints_are_admin_only(self):
+        with profiling.profile("cprofile", source="test") as run:
+            sum(range(1000))
+        paths = ["/profiles/", f"/profiles/{run.id}/", f"/profiles/{run.id}/txt/"]
+        client = APIClient()
+        for path in paths:
+            self.assertIn(client.get(path).status_code, (401, 403))
+        client.force_authenticate(self.user)
+        for path in paths:
+            self.assertEqual(client.get(path).status_code, 403)
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.get("/profiles/").json()["results"][0]["id"], run.id)
+        response = client.get(f"/profiles/{run.id}/txt/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"function calls", b"".join(response.streaming_content))
+        self.assertEqual(client.get(f"/profiles/{run.id}/..%2F..%2Fmanage.py/").status_code, 404)
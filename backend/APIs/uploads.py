@@ -0,0 +1,435 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils import timezone
+from filelock import FileLock
+from langchain.schema import Document
+
+from .models import UploadSession
+from .utils import load_document
+
+_OBJECT = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_CATALOG = re.compile(rb"(\d+)\s+0\s+obj\s*<<[^>]*?/Type\s*/Catalog")
+_BLOCK = 1024 * 1024
+
+
+class UploadError(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the upload currently ends."""
+
+    def __init__(self, expected):
+        super().__init__(f"Chunk offset does not match; resume from offset {expected}")
+        self.expected = expected
+
+
+def upload_dir():
+    return Path(getattr(settings, "UPLOAD_DIR", settings.BASE_DIR / "uploads"))
+
+
+def part_path(upload_id):
+    return upload_dir() / f"{upload_id}.part"
+
+
+def _pages_path(upload_id):
+    return upload_dir() / f"{upload_id}.pages.json"
+
+
+def _documents_path(upload_id):
+    return upload_dir() / f"{upload_id}.documents.json"
+
+
+def _lock_path(upload_id):
+    return upload_dir() / f"{upload_id}.lock"
+
+
+def _write_json(path, data):
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default):
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return default
+
+
+# Incremental hashing
+
+_hashers = {}  # upload id -> (offset, sha256 object) for uploads appended through this process
+_hashers_lock = threading.Lock()
+
+
+def _hasher(session):
+    """Return the running SHA-256 of the received bytes, rebuilt from disk if this process hasn't seen them."""
+    with _hashers_lock:
+        offset, sha = _hashers.get(session.id, (None, None))
+    if offset == session.received:
+        return sha.copy()
+    sha = hashlib.sha256()
+    with open(part_path(session.id), "rb") as f:
+        remaining = session.received
+        while remaining:
+            block = f.read(min(_BLOCK, remaining))
+            if not block:
+                break
+            sha.update(block)
+            remaining -= len(block)
+    return sha
+
+
+# Early PDF page extraction
+
+class _PartialPdf(io.RawIOBase):
+    """Read-only view of the first ``length`` bytes of ``f`` followed by ``tail``."""
+
+    def __init__(self, f, length, tail):
+        self.f, self.length, self.tail, self.pos = f, length, tail, 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.length + len(self.tail)}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        if self.pos < self.length:
+            self.f.seek(self.pos)
+            n = self.f.readinto(view[:min(len(view), self.length - self.pos)])
+        else:
+            data = self.tail[self.pos - self.length:self.pos - self.length + len(view)]
+            n = len(data)
+            view[:n] = data
+        self.pos += n
+        return n
+
+
+def _missing_objects(obj, offsets):
+    """Numbers of the objects reachable from ``obj`` (except through /Parent) that haven't arrived."""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    missing, seen, stack = set(), set(), [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, IndirectObject):
+            if item.idnum in seen:
+                continue
+            seen.add(item.idnum)
+            try:
+                if str(item.idnum) not in offsets:
+                    raise KeyError(item.idnum)
+                item = item.get_object()
+            except Exception:
+                missing.add(item.idnum)
+                continue
+        if isinstance(item, DictionaryObject):
+            stack.extend(value for key, value in dict.items(item) if key != "/Parent")
+        elif isinstance(item, ArrayObject):
+            stack.extend(list.__iter__(item))
+    return missing
+
+
+def extract_available_pages(path, state):
+    """Extract text of the PDF pages whose objects have fully arrived in the file at ``path``.
+
+    Builds a cross-reference table over the complete top-level objects so the
+    partial file can be parsed. ``state`` carries the scan between calls and
+    is updated in place: ``scanned`` (end of the last complete object),
+    the object ``offsets``, the ``catalog`` object number and the ``pending``
+    pages with the fonts or content streams they are waiting for. Only bytes
+    past ``scanned`` are read, and only new objects and pending pages whose
+    missing objects arrived are parsed, so calling this after every chunk
+    stays linear in the upload size.
+    Returns {page object number: text} for the newly extracted pages.
+    """
+    import pypdf
+    from pypdf.generic import DictionaryObject, IndirectObject
+
+    scanned = state.get("scanned", 0)
+    with open(path, "rb") as f:
+        f.seek(scanned)
+        data = f.read()
+        end = data.rfind(b"endobj")
+        if end < 0:
+            return {}
+        data = data[:end + len(b"endobj")]
+        offsets = state.setdefault("offsets", {})
+        new = set()
+        for m in _OBJECT.finditer(data):
+            offsets[m.group(1).decode()] = scanned + m.start()
+            new.add(int(m.group(1)))
+        if state.get("catalog") is None:
+            catalog = _CATALOG.search(data)
+            state["catalog"] = int(catalog.group(1)) if catalog else None
+        scanned = state["scanned"] = scanned + len(data)
+        # page object number -> numbers of the objects it is still waiting for
+        pending = {int(n): set(waiting) for n, waiting in state.get("pending", {}).items()}
+        pending.update({number: set() for number in new})
+        if state["catalog"] is None:
+            state["pending"] = {str(n): sorted(waiting) for n, waiting in pending.items()}
+            return {}
+
+        size = max(map(int, offsets)) + 1
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % size]
+        for number in range(1, size):
+            offset = offsets.get(str(number))
+            xref.append(b"%010d 00000 n \n" % offset if offset is not None else b"0000000000 65535 f \n")
+        trailer = b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, state["catalog"], scanned + 1)
+
+        pypdf_logger = logging.getLogger("pypdf")
+        level = pypdf_logger.level
+        pypdf_logger.setLevel(logging.ERROR)  # a partial file produces lots of harmless warnings
+        try:
+            stream = io.BufferedReader(_PartialPdf(f, scanned, b"\n" + b"".join(xref) + trailer))
+            reader = pypdf.PdfReader(stream, strict=False)
+            pages = {}
+            for number in sorted(n for n, waiting in pending.items() if not waiting or waiting & new):
+                del pending[number]
+                try:
+                    obj = reader.get_object(IndirectObject(number, 0, reader))
+                    if not isinstance(obj, DictionaryObject) or obj.get("/Type") != "/Page":
+                        continue
+                    missing = _missing_objects(obj, offsets)
+                    if missing:
+                        pending[number] = missing
+                        continue
+                    page = pypdf.PageObject(reader, IndirectObject(number, 0, reader))
+                    page.update(obj)
+                    pages[number] = page.extract_text()
+                except Exception:
+                    pending[number] = set()  # retried on the next call
+            state["pending"] = {str(n): sorted(waiting) for n, waiting in pending.items()}
+            return pages
+        finally:
+            pypdf_logger.setLevel(level)
+
+
+class EarlyPageExtractor:
+    """
+    Extracts PDF pages in the background while an upload is still open.
+
+    One thread per upload in this process; appends that arrive while it runs
+    trigger one more pass afterwards. Results and the scan state are kept in
+    ``<id>.pages.json`` so each pass resumes where the last one stopped and the
+    worker that completes the upload can reuse the pages.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.rerun = set()
+
+    def schedule(self, session):
+        if not session.filename.lower().endswith(".pdf"):
+            return
+        with self.lock:
+            if session.id in self.threads:
+                self.rerun.add(session.id)
+                return
+            thread = threading.Thread(target=self._run, args=(session.id,), name=f"extract-{session.id}", daemon=True)
+            self.threads[session.id] = thread
+        thread.start()
+
+    def _run(self, upload_id):
+        try:
+            while True:
+                state = _read_json(_pages_path(upload_id), {})
+                scanned = state.get("scanned", 0)
+                pages = extract_available_pages(part_path(upload_id), state)
+                if state.get("scanned", 0) != scanned:
+                    state.setdefault("pages", {}).update({str(n): text for n, text in pages.items()})
+                    _write_json(_pages_path(upload_id), state)
+                with self.lock:
+                    if upload_id not in self.rerun:
+                        del self.threads[upload_id]
+                        return
+                    self.rerun.discard(upload_id)
+        except Exception as e:
+            print(f"Early page extraction failed for upload {upload_id}: {e}")
+            with self.lock:
+                self.threads.pop(upload_id, None)
+                self.rerun.discard(upload_id)
+
+    def wait(self, upload_id, timeout=None):
+        with self.lock:
+            self.rerun.discard(upload_id)
+            thread = self.threads.get(upload_id)
+        if thread is not None:
+            thread.join(timeout)
+
+
+page_extractor = EarlyPageExtractor()
+
+
+# Upload lifecycle
+
+def create_upload(filename, size=None):
+    max_bytes = getattr(settings, "UPLOAD_MAX_BYTES", 200 * 1024 * 1024)
+    if size is not None and size > max_bytes:
+        raise UploadError(f"Upload exceeds the {max_bytes} byte limit")
+    prune_uploads()
+    session = UploadSession.objects.create(filename=os.path.basename(filename)[:255], size=size)
+    upload_dir().mkdir(parents=True, exist_ok=True)
+    part_path(session.id).touch()
+    return session
+
+
+def get_upload(upload_id):
+    try:
+        return UploadSession.objects.get(pk=upload_id)
+    except (UploadSession.DoesNotExist, ValueError, ValidationError):
+        return None
+
+
+def _upload_lock(upload_id):
+    return FileLock(str(_lock_path(upload_id)))
+
+
+def append_chunk(upload_id, offset, chunk):
+    """Append an uploaded chunk at ``offset``; the running hash is updated as it is written.
+
+    The file lock serializes writers of one upload across processes, and the
+    offset is enforced by a conditional UPDATE rather than a row lock, which
+    SQLite does not provide.
+    """
+    max_bytes = getattr(settings, "UPLOAD_MAX_BYTES", 200 * 1024 * 1024)
+    with _upload_lock(upload_id):
+        session = UploadSession.objects.get(pk=upload_id)
+        if session.status != "OPEN":
+            raise UploadError("Upload is already complete")
+        if offset != session.received:
+            raise OffsetMismatch(session.received)
+        limit = min(session.size if session.size is not None else max_bytes, max_bytes)
+        if session.received + chunk.size > limit:
+            raise UploadError(f"Chunk would exceed the upload size of {limit} bytes")
+
+        sha = _hasher(session)
+        with open(part_path(session.id), "r+b") as f:
+            # Drop bytes of an earlier append that was written but never recorded
+            f.truncate(offset)
+            f.seek(offset)
+            for block in chunk.chunks():
+                f.write(block)
+                sha.update(block)
+            updated = UploadSession.objects.filter(pk=upload_id, status="OPEN", received=offset).update(
+                received=offset + chunk.size, updated_at=timezone.now()
+            )
+            if not updated:
+                f.truncate(offset)
+                session.refresh_from_db()
+                if session.status != "OPEN":
+                    raise UploadError("Upload is already complete")
+                raise OffsetMismatch(session.received)
+        session.received = offset + chunk.size
+    with _hashers_lock:
+        _hashers[session.id] = (session.received, sha)
+    page_extractor.schedule(session)
+    return session
+
+
+def _assemble_pdf(session, early_pages):
+    import pypdf
+
+    path = part_path(session.id)
+    reader = pypdf.PdfReader(str(path))
+    # Incremental updates can redefine objects after their first version arrived
+    if path.read_bytes().count(b"%%EOF") > 1:
+        early_pages = {}
+    documents, reused = [], 0
+    for number, page in enumerate(reader.pages):
+        ref = page.indirect_reference
+        text = early_pages.get(str(ref.idnum)) if ref is not None else None
+        if text is None:
+            text = page.extract_text()
+        else:
+            reused += 1
+        documents.append(Document(page_content=text, metadata={"source": session.filename, "page": number}))
+    print(f"Upload {session.id}: {reused}/{len(documents)} pages extracted before completion")
+    return documents
+
+
+def complete_upload(upload_id, sha256=None):
+    """Finish an upload, verify its size and hash, and extract its pages.
+
+    Returns (session, documents); completing twice returns the first result.
+    Holds the upload's lock so no chunk is appended while it is finalized.
+    """
+    if get_upload(upload_id) is None:
+        raise UploadError("Unknown upload")
+    with _upload_lock(upload_id):
+        return _complete(get_upload(upload_id), sha256)
+
+
+def _complete(session, sha256):
+    if session.status == "COMPLETE":
+        return session, load_upload_documents(session)
+    if session.size is not None and session.received != session.size:
+        raise UploadError(f"Upload incomplete: {session.received} of {session.size} bytes received")
+    if not session.received:
+        raise UploadError("Upload is empty")
+
+    digest = _hasher(session).hexdigest()
+    if sha256 and sha256.lower() != digest:
+        raise UploadError(f"SHA-256 mismatch: received content hashes to {digest}")
+
+    page_extractor.wait(session.id, timeout=getattr(settings, "UPLOAD_EXTRACT_WAIT", 30))
+    documents = None
+    if session.filename.lower().endswith(".pdf"):
+        try:
+            documents = _assemble_pdf(session, _read_json(_pages_path(session.id), {}).get("pages", {}))
+        except ImportError:
+            documents = None
+    if documents is None:
+        with open(part_path(session.id), "rb") as f:
+            documents = load_document(File(f, name=session.filename))
+
+    _write_json(_documents_path(session.id), [
+        {"page_content": document.page_content, "metadata": document.metadata} for document in documents
+    ])
+    _pages_path(session.id).unlink(missing_ok=True)
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    session.sha256 = digest
+    session.status = "COMPLETE"
+    session.save(update_fields=["sha256", "status", "updated_at"])
+    return session, documents
+
+
+def load_upload_documents(session):
+    """Return the pages extracted when the upload completed."""
+    pages = _read_json(_documents_path(session.id), [])
+    return [Document(page_content=page["page_content"], metadata=page["metadata"]) for page in pages]
+
+
+def prune_uploads():
+    """Delete uploads untouched for longer than UPLOAD_EXPIRY_HOURS."""
+    cutoff = timezone.now() - timedelta(hours=getattr(settings, "UPLOAD_EXPIRY_HOURS", 24))
+    for upload_id in UploadSession.objects.filter(updated_at__lt=cutoff).values_list("id", flat=True):
+        for path in (part_path(upload_id), _pages_path(upload_id), _documents_path(upload_id), _lock_path(upload_id)):
+            path.unlink(missing_ok=True)
+        UploadSession.objects.filter(pk=upload_id).delete()
+        with _hashers_lock:
+            _hashers.pop(upload_id, None)
@@ -1,6 +1,24 @@
 from django.urls import path
-from .views import DocumentAnalysisView
+from .views import (
+    DocumentAnalysisView, ProposalAnalysisView, LLMMetricsView,
+    UploadCreateView, UploadDetailView, UploadChunkView, UploadCompleteView, SimilarDocumentsView, AnalysisListView, AnalysisDetailView,
+    ChainProposalListView, ChainProposalDetailView, ProfileListView, ProfileDetailView
+)
 
 urlpatterns = [
     path('analyze/', DocumentAnalysisView.as_view(), name='analyze-document'),
+    path('uploads/', UploadCreateView.as_view(), name='upload-create'),
+    path('uploads/<uuid:upload_id>/', UploadDetailView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:upload_id>/chunks/', UploadChunkView.as_view(), name='upload-chunk'),
+    path('uploads/<uuid:upload_id>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+    path('proposals/analyze/', ProposalAnalysisView.as_view(), name='analyze-proposal'),
+    path('analyses/', AnalysisListView.as_view(), name='analysis-list'),
+    path('analyses/<int:pk>/', AnalysisDetailView.as_view(), name='analysis-detail'),
+    path('chain/proposals/', ChainProposalListView.as_view(), name='chain-proposal-list'),
+    path('chain/proposals/<int:proposal_id>/', ChainProposalDetailView.as_view(), name='chain-proposal-detail'),
+    path('similar/', SimilarDocumentsView.as_view(), name='similar-documents'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('profiles/<str:profile_id>/<str:artifact>/', ProfileDetailView.as_view(), name='profile-artifact'),
+    path('metrics/llm/', LLMMetricsView.as_view(), name='llm-metrics'),
 ]
\ No newline at end of file
@@ -1,14 +1,24 @@
 import os
+import json
+import hashlib
+import time
 import tempfile
+from functools import lru_cache
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 import warnings
+from .llm import get_llm
+from .routing import QUESTION_CLASS_TIERS, TierMetrics, TierMetricsHandler, tier_config, tier_for_question
+from .extraction import extract_financial_facts, answer_financial_questions, format_financial_facts
+from .early_exit import (
+    EARLY_EXIT_ENABLED, early_exit_decision, evaluate as evaluate_early_exit, load_rules as load_early_exit_rules,
+    order_questions,
+)
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -18,8 +28,9 @@ load_dotenv()
 ## load the GROQ API KEY 
 groq_api_key = os.getenv('GROQ_API_KEY')
 
-# Set your Groq API key
-os.environ["GROQ_API_KEY"] = os.getenv('GROQ_API_KEY')
+# Set your Groq API key (not needed for local or fake LLM providers)
+if groq_api_key:
+    os.environ["GROQ_API_KEY"] = groq_api_key
 
 # Define standard evaluation questions
 STANDARD_QUESTIONS = [
@@ -84,6 +95,23 @@ Be decisive and authoritative in your assessment.
 # if confdence is near 60, give it for review, if it is above 70, give it for approval, if it is below 50, give it for rejection.
 # """
 
+def compute_file_hash(file):
+    """Return the SHA-256 hex digest of an uploaded file and rewind it."""
+    sha = hashlib.sha256()
+    for chunk in file.chunks() if hasattr(file, "chunks") else [file.read()]:
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()
+
+def questions_hash(custom_questions=None):
+    """Short stable hash of a custom question set."""
+    questions = json.dumps(custom_questions or [], sort_keys=True)
+    return hashlib.sha256(questions.encode()).hexdigest()[:16]
+
+def analysis_key(document_hash, custom_questions=None):
+    """Identify an analysis run by document content and question set."""
+    return f"{document_hash}:{questions_hash(custom_questions)}"
+
 def load_document(file):
     """Load a document from various file formats."""
     file_ext = os.path.splitext(file.name)[1].lower()
@@ -126,36 +154,68 @@ def load_document(file):
     finally:
         os.unlink(temp_path)  # Clean up temp file
 
-def create_rag_system(documents):
-    """Create a RAG system from documents."""
-    # Split documents into chunks
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Load the sentence-transformers embedding model once per process."""
+    # Using HuggingFace embeddings as an alternative to OpenAI embeddings
+    return HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_kwargs={'device': 'cpu'}
+    )
+
+def preload_models():
+    """Load the embedding model and tokenizer so forked workers share them copy-on-write.
+
+    Meant to run in the gunicorn master before fork (see gunicorn.conf.py). No
+    inference is run here: a forward pass would start torch's OpenMP thread pool,
+    which is not fork-safe.
+    """
+    import gc
+
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    get_embeddings()
+    # Move everything allocated so far out of the GC's tracked generations so
+    # collections in the workers don't write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+    print("Embedding model preloaded for copy-on-write sharing")
+
+def configure_torch_threads(num_threads):
+    """Set torch intra-op threads for this process (called per worker after fork)."""
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+def split_documents(documents):
+    """Split documents into overlapping chunks for indexing; metadata is kept per chunk."""
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200,
         length_function=len
     )
-    chunks = text_splitter.split_documents(documents)
+    return text_splitter.split_documents(documents)
+
+def build_vector_store(documents):
+    """Split documents into chunks and index them in an in-memory FAISS store."""
+    chunks = split_documents(documents)
     
     # Create embeddings and vector store
-    # Using HuggingFace embeddings as an alternative to OpenAI embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
-    vector_store = FAISS.from_documents(chunks, embeddings)
+    return FAISS.from_documents(chunks, get_embeddings())
+
+def create_rag_system(documents):
+    """Create a RAG system from documents, returning QA chains keyed by tier."""
+    vector_store = build_vector_store(documents)
     
     # Create retriever
     retriever = vector_store.as_retriever(
         search_kwargs={"k": 4}
     )
     
-    # Create QA chain with Groq - using working model
-    llm = ChatGroq(
-        model_name="llama-3.1-8b-instant",  # Updated to working model
-        temperature=0
-    )
-    
-    qa_prompt_template = """
+    return create_qa_chains(retriever)
+
+QA_PROMPT_TEMPLATE = """
     You are a government funding reviewer analyzing documents to determine if projects should receive funding.
     Use the following context to answer the question. If you don't know the answer, say "Information not found in document" rather than making up information.
     
@@ -165,68 +225,172 @@ def create_rag_system(documents):
     
     Answer:
     """
-    
+
+def create_qa_chains(retriever, document_prompt=None):
+    """Create one QA chain per question tier over a shared retriever.
+
+    ``document_prompt`` formats each retrieved chunk in the context (e.g. to show
+    which file it came from).
+    """
     qa_prompt = PromptTemplate(
-        template=qa_prompt_template,
+        template=QA_PROMPT_TEMPLATE,
         input_variables=["context", "question"]
     )
+    chain_type_kwargs = {"prompt": qa_prompt}
+    if document_prompt is not None:
+        chain_type_kwargs["document_prompt"] = document_prompt
     
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        chain_type_kwargs={"prompt": qa_prompt}
-    )
+    qa_chains = {}
+    for tier in set(QUESTION_CLASS_TIERS.values()):
+        # Each tier uses its own model/max tokens from the configured LLM provider (Groq by default)
+        config = tier_config(tier)
+        llm = get_llm(
+            model_name=config["model"],
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"]
+        )
+        qa_chains[tier] = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=retriever,
+            chain_type_kwargs=chain_type_kwargs
+        )
     
-    return qa_chain
+    return qa_chains
+
+def analyze_document(qa_chains, questions=None, precomputed_answers=None, run_metrics=None):
+    """Run a list of questions through the QA chains, routing each question to its tier.
 
-def analyze_document(qa_chain, questions=None):
-    """Run a list of questions through the QA chain."""
+    ``qa_chains`` is the tier -> chain mapping from ``create_rag_system`` (a single chain is
+    also accepted). Questions present in ``precomputed_answers`` are answered from it instead
+    of the LLM.
+    """
     # Use standard questions if no custom questions provided
     if questions is None:
         questions = STANDARD_QUESTIONS
+    precomputed_answers = precomputed_answers or {}
         
     results = []
     for question in questions:
-        answer = qa_chain.invoke({"query": question})
+        if question in precomputed_answers:
+            results.append({
+                "Question": question,
+                "Answer": precomputed_answers[question]
+            })
+            continue
         results.append({
             "Question": question,
-            "Answer": answer["result"]
+            "Answer": answer_question(qa_chains, question, run_metrics)
         })
     return results
 
-def make_decision(analysis_results):
-    """Make a funding decision based on analysis results."""
-    llm = ChatGroq(
-        model_name="llama-3.1-8b-instant",  # Updated to working model
-        temperature=0.2
+def answer_question(qa_chains, question, run_metrics=None):
+    """Answer one question with the QA chain of its tier."""
+    tier = tier_for_question(question)
+    qa_chain = qa_chains[tier] if isinstance(qa_chains, dict) else qa_chains
+    handler = TierMetricsHandler(tier, tier_config(tier)["model"], run_metrics)
+    answer = qa_chain.invoke({"query": question}, config={"callbacks": [handler]})
+    return answer["result"]
+
+def analyze_document_ordered(qa_chains, questions=None, precomputed_answers=None, run_metrics=None, rules=None):
+    """Answer questions high-signal first, stopping as soon as an early-exit rule fires.
+
+    Precomputed answers are reported as they are but never end the run: the
+    rules judge what the LLM read in the document, not the extraction
+    heuristics. Red-flag, analysis and factual questions go to the LLM in that
+    order. Returns the answered questions in their original order and the
+    early-exit record (rule, decision, question, evidence, skipped_questions),
+    or None if the run completed.
+    """
+    if questions is None:
+        questions = STANDARD_QUESTIONS
+    precomputed_answers = precomputed_answers or {}
+    rules = load_early_exit_rules() if rules is None else rules
+    
+    answers = {q: precomputed_answers[q] for q in questions if q in precomputed_answers}
+    early_exit = None
+    pending = order_questions([q for q in questions if q not in precomputed_answers])
+    for position, question in enumerate(pending):
+        answers[question] = answer_question(qa_chains, question, run_metrics)
+        early_exit = evaluate_early_exit(question, answers[question], rules)
+        if early_exit:
+            early_exit["skipped_questions"] = pending[position + 1:]
+            print(f"Early exit ({early_exit['rule']}): {early_exit['decision']}, "
+                  f"skipped {len(early_exit['skipped_questions'])} LLM questions")
+            break
+    
+    results = [{"Question": q, "Answer": answers[q]} for q in questions if q in answers]
+    return results, early_exit
+
+def make_decision(analysis_results, financial_facts=None, run_metrics=None):
+    """Make a funding decision based on analysis results and extracted financial facts."""
+    config = tier_config("decision")
+    llm = get_llm(
+        model_name=config["model"],
+        temperature=config["temperature"],
+        max_tokens=config["max_tokens"]
     )
     
     # Format analysis results for the prompt
     formatted_results = ""
     for result in analysis_results:
         formatted_results += f"Question: {result['Question']}\nAnswer: {result['Answer']}\n\n"
+    formatted_results += format_financial_facts(financial_facts)
     
     decision_prompt = DECISION_PROMPT.format(analysis_results=formatted_results)
-    decision = llm.invoke(decision_prompt)
+    handler = TierMetricsHandler("decision", config["model"], run_metrics)
+    decision = llm.invoke(decision_prompt, config={"callbacks": [handler]})
     
     return decision.content
 
-def process_document(file, custom_questions=None):
-    """Process document and return analysis results and decision."""
+def decision_status(decision_text):
+    """Map the decision text to APPROVED, REJECTED or REVIEW."""
+    if "DECISION: APPROVED" in decision_text:
+        return "APPROVED"
+    if "DECISION: REJECTED" in decision_text:
+        return "REJECTED"
+    return "REVIEW"
+
+def process_document(file, custom_questions=None, document_hash=None, documents=None):
+    """Process document and return analysis results and decision.
+
+    When ``document_hash`` is given the document's chunks are also added to the
+    cross-proposal similarity corpus. ``documents`` skips loading when the caller
+    has already loaded the file.
+    """
     try:
         print(f"=== process_document START ===")
         print(f"File: {file.name}, Size: {file.size}")
         
+        # Wall-clock seconds per pipeline stage
+        timings = {}
+        stage_start = time.perf_counter()
+        
+        def lap(stage):
+            nonlocal stage_start
+            now = time.perf_counter()
+            timings[stage] = round(now - stage_start, 3)
+            stage_start = now
+        
         # Load document
         print("Loading document...")
-        documents = load_document(file)
+        if documents is None:
+            documents = load_document(file)
         print(f"Document loaded. Number of pages/chunks: {len(documents)}")
+        lap("load")
+        
+        # Extract budget/expenditure figures locally
+        financial_facts = extract_financial_facts(documents)
+        print(f"Financial facts extracted: approved={financial_facts['approved_amount']}, "
+              f"expenditure={financial_facts['expenditure_amount']}")
+        lap("extraction")
         
         # Create RAG system
         print("Creating RAG system...")
-        qa_chain = create_rag_system(documents)
+        vector_store = build_vector_store(documents)
+        qa_chains = create_qa_chains(vector_store.as_retriever(search_kwargs={"k": 4}))
         print("RAG system created successfully")
+        lap("indexing")
         
         # Merge standard questions with custom questions if provided
         questions = STANDARD_QUESTIONS.copy()
@@ -236,34 +400,57 @@ def process_document(file, custom_questions=None):
         
         # Run analysis
         print("Running document analysis...")
-        analysis_results = analyze_document(qa_chain, questions)
+        precomputed_answers = answer_financial_questions(financial_facts, questions)
+        print(f"Answered {len(precomputed_answers)} financial questions without LLM")
+        run_metrics = TierMetrics()
+        early_exit = None
+        if EARLY_EXIT_ENABLED:
+            analysis_results, early_exit = analyze_document_ordered(qa_chains, questions, precomputed_answers, run_metrics)
+        else:
+            analysis_results = analyze_document(qa_chains, questions, precomputed_answers, run_metrics)
         print(f"Analysis completed. Results: {len(analysis_results)} answers")
+        lap("questions")
         
-        # Make approval decision
+        # Make approval decision (an early exit already decided without the LLM)
         print("Making funding decision...")
-        decision_text = make_decision(analysis_results)
+        if early_exit:
+            decision_text = early_exit_decision(early_exit)
+        else:
+            decision_text = make_decision(analysis_results, financial_facts, run_metrics)
         print(f"Decision made: {decision_text[:100]}...")
+        lap("decision")
         
         # Determine status
-        status = "REVIEW"  # Default
-        if "DECISION: APPROVED" in decision_text:
-            status = "APPROVED"
-        elif "DECISION: REJECTED" in decision_text:
-            status = "REJECTED"
-        elif "DECISION: REVIEW" in decision_text:
-            status = "REVIEW"
+        status = decision_status(decision_text)
         
         print(f"Final status: {status}")
         
+        # Compare against previously analyzed proposals and add this one to the corpus
+        similar_documents = []
+        if document_hash:
+            try:
+                from .corpus import corpus_index
+                similar_documents = corpus_index.add_vector_store(document_hash, file.name, vector_store)
+                print(f"Corpus updated. Similar documents: {len(similar_documents)}")
+            except Exception as e:
+                print(f"Corpus update failed: {e}")
+            lap("corpus")
+        timings["total"] = round(sum(timings.values()), 3)
+        
         # Generate report
         report = {
             "analysis": analysis_results,
+            "financial_facts": financial_facts,
+            "similar_documents": similar_documents,
+            "llm_metrics": run_metrics.snapshot(),
+            "early_exit": early_exit,
             "decision": decision_text
         }
         
         result = {
             "status": status,
-            "report": report
+            "report": report,
+            "timings": timings
         }
         
         print("=== process_document SUCCESS ===")
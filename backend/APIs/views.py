@@ -1,37 +1,157 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .utils import process_document
+from rest_framework.permissions import IsAdminUser
+from .utils import process_document, compute_file_hash, analysis_key, questions_hash, load_document, build_vector_store, get_embeddings
+from .singleflight import SingleFlight
+from .dedup import near_duplicate_index, minhash_signature
+from .extraction import extract_financial_facts
+from .routing import llm_metrics, MODEL_TIERS, tier_config
+from .ipfs import blob_cache, guess_filename, CIDError, ContentTooLarge
+from .proposals import run_proposal_analysis, proposal_hash
+from . import uploads
+from . import profiling
+from .models import Analysis, ChainProposal, ChainIndexerState
 from django.core.files.uploadedfile import UploadedFile
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.conf import settings
+from django.db.models import Q
 import json
+import base64
+import binascii
 import traceback
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Concurrent identical analyses (same document and questions) share one run
+analysis_flight = SingleFlight()
+
+def run_analysis(file, custom_questions, document_hash, force=False, documents=None):
+    """Load a document, reuse the analysis of a near-duplicate if allowed, otherwise analyze it.
+
+    Every run is persisted as an ``Analysis`` record. ``documents`` skips loading
+    when the pages were already extracted (chunked uploads).
+    """
+    q_hash = questions_hash(custom_questions)
+    try:
+        if documents is None:
+            documents = load_document(file)
+        signature = minhash_signature("\n".join(doc.page_content for doc in documents))
+        near_duplicates = near_duplicate_index.find(signature) if signature is not None else []
+        print(f"Near-duplicate documents: {len(near_duplicates)}")
+        
+        if near_duplicates and not force and getattr(settings, "DEDUP_SHORT_CIRCUIT", False):
+            match, prior = near_duplicate_index.reusable_analysis(
+                near_duplicates, q_hash, extract_financial_facts(documents)
+            )
+            if prior is not None:
+                print(f"Reusing analysis {prior.id} of {match['document_hash']} (similarity {match['similarity']:.2f})")
+                analysis = Analysis.objects.create(
+                    document_hash=document_hash,
+                    questions_hash=q_hash,
+                    source=file.name[:255],
+                    status=prior.status,
+                    decision=prior.decision,
+                    answers=prior.answers,
+                    report=prior.report,
+                    reused_from=prior,
+                )
+                return {
+                    "status": prior.status,
+                    "report": prior.report,
+                    "analysis_id": analysis.id,
+                    "near_duplicates": near_duplicates,
+                    "reused_from": {**match, "analysis_id": prior.id},
+                }
+        
+        result = process_document(file, custom_questions, document_hash, documents=documents)
+        if signature is not None:
+            near_duplicate_index.add(document_hash, file.name, signature)
+    except Exception as e:
+        Analysis.objects.create(
+            document_hash=document_hash,
+            questions_hash=q_hash,
+            source=file.name[:255],
+            status="FAILED",
+            error=str(e),
+        )
+        raise
+    
+    analysis = Analysis.objects.create(
+        document_hash=document_hash,
+        questions_hash=q_hash,
+        source=file.name[:255],
+        status=result["status"],
+        decision=result["report"]["decision"],
+        answers=result["report"]["analysis"],
+        report=result["report"],
+        timings=result["timings"],
+    )
+    return {**result, "analysis_id": analysis.id, "near_duplicates": near_duplicates}
+
 class DocumentAnalysisView(APIView):
     """
     API endpoint for analyzing government funding documents.
+    
+    Accepts an uploaded ``file``, the IPFS ``cid`` of a stage report
+    (optionally with a ``filename``; CID content is served from the local
+    blob cache when available) or the ``upload_id`` of a completed chunked
+    upload, whose hash and pages are already computed.
     """
     
     def post(self, request, *args, **kwargs):
+        part_file = None
         try:
             print("=== DocumentAnalysisView POST Request ===")
             print(f"Request FILES: {request.FILES}")
             print(f"Request data: {request.data}")
             
-            # Check if file is in request
-            if 'file' not in request.FILES:
+            # Check if file, CID or chunked upload is in request
+            documents = None
+            document_hash = None
+            if 'file' in request.FILES:
+                # Get file from request
+                file = request.FILES['file']
+                print(f"File received: {file.name}, Size: {file.size}, Type: {file.content_type}")
+            elif request.data.get('cid'):
+                cid = request.data['cid'].strip()
+                try:
+                    content, cache_hit = blob_cache.get(cid)
+                except ContentTooLarge as e:
+                    return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                except CIDError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                except Exception as e:
+                    logger.error(f"IPFS fetch failed for {cid}: {e}")
+                    return Response(
+                        {"error": f"Could not fetch {cid} from IPFS: {e}", "type": "ipfs_error"},
+                        status=status.HTTP_502_BAD_GATEWAY
+                    )
+                file = ContentFile(content, name=request.data.get('filename') or guess_filename(cid, content))
+                print(f"CID {cid} loaded ({'cache hit' if cache_hit else 'downloaded'}): {file.name}, Size: {file.size}")
+            elif request.data.get('upload_id'):
+                upload = uploads.get_upload(request.data['upload_id'])
+                if upload is None or upload.status != "COMPLETE":
+                    return Response(
+                        {"error": "Unknown or incomplete upload"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                part_file = open(uploads.part_path(upload.id), 'rb')
+                file = File(part_file, name=upload.filename)
+                documents = uploads.load_upload_documents(upload)
+                document_hash = upload.sha256
+                print(f"Chunked upload {upload.id} loaded: {file.name}, {len(documents)} pages")
+            else:
                 print("Error: No file provided")
                 return Response(
                     {"error": "No file provided"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get file from request
-            file = request.FILES['file']
-            print(f"File received: {file.name}, Size: {file.size}, Type: {file.content_type}")
-            
             # Get custom questions if provided
             custom_questions = None
             if 'custom_questions' in request.data:
@@ -45,9 +165,29 @@ class DocumentAnalysisView(APIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
+            document_hash = document_hash or compute_file_hash(file)
+            print(f"Document hash: {document_hash}")
+            
             print("Starting document processing...")
-            # Process document
-            result = process_document(file, custom_questions)
+            # Process document, joining an identical in-flight analysis if there is one
+            force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+            # coalesce=false runs even if an identical request is in flight (load testing)
+            coalesce = str(request.data.get('coalesce', 'true')).lower() not in ('0', 'false', 'no')
+            profile_mode = profiling.requested_mode(request)
+            if profile_mode:
+                # Profiled runs never join another request's flight
+                with profiling.profile(profile_mode, source=file.name, document_hash=document_hash) as profile:
+                    result = run_analysis(file, custom_questions, document_hash, force, documents)
+                result = {**result, "profile_id": profile.id}
+            elif not coalesce:
+                result = run_analysis(file, custom_questions, document_hash, force, documents)
+            else:
+                result, shared = analysis_flight.do(
+                    analysis_key(document_hash, custom_questions) + (":force" if force else ""),
+                    run_analysis, file, custom_questions, document_hash, force, documents
+                )
+                if shared:
+                    print("Joined in-flight analysis for identical request")
             print(f"Processing completed. Result status: {result.get('status', 'Unknown')}")
             
             return Response(result, status=status.HTTP_200_OK)
@@ -87,4 +227,377 @@ class DocumentAnalysisView(APIView):
                     "suggestion": "Please check the server logs and ensure all dependencies are installed"
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+        finally:
+            if part_file is not None:
+                part_file.close()
+
+
+class UploadCreateView(APIView):
+    """
+    API endpoint starting a chunked, resumable upload.
+    
+    POST ``filename`` and optionally the total ``size``; then send the bytes in
+    order to ``/uploads/<id>/chunks/`` and finish with ``/uploads/<id>/complete/``.
+    The returned ``upload_id`` can be passed to ``/analyze/``.
+    """
+    
+    def post(self, request, *args, **kwargs):
+        filename = request.data.get('filename')
+        if not filename:
+            return Response({"error": "filename is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = int(request.data['size']) if request.data.get('size') not in (None, '') else None
+            upload = uploads.create_upload(filename, size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {**upload.to_dict(), "chunk_size": getattr(settings, "UPLOAD_CHUNK_SIZE", 5 * 1024 * 1024)},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class UploadDetailView(APIView):
+    """
+    API endpoint returning an upload's state; ``offset`` is where to resume.
+    """
+    
+    def get(self, request, upload_id, *args, **kwargs):
+        upload = uploads.get_upload(upload_id)
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(upload.to_dict(), status=status.HTTP_200_OK)
+
+
+class UploadChunkView(APIView):
+    """
+    API endpoint appending a ``chunk`` (multipart file) at ``offset``.
+    
+    A chunk that doesn't start at the current end of the upload is rejected
+    with 409 and the offset to resume from.
+    """
+    
+    def post(self, request, upload_id, *args, **kwargs):
+        if 'chunk' not in request.FILES:
+            return Response({"error": "No chunk provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if uploads.get_upload(upload_id) is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            upload = uploads.append_chunk(upload_id, int(request.data.get('offset', -1)), request.FILES['chunk'])
+        except uploads.OffsetMismatch as e:
+            return Response({"error": str(e), "offset": e.expected}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload.to_dict(), status=status.HTTP_200_OK)
+
+
+class UploadCompleteView(APIView):
+    """
+    API endpoint finishing an upload, optionally checking the client's ``sha256``.
+    
+    Returns the content hash and page count; PDF pages that arrived complete
+    were already extracted while the upload was in progress.
+    """
+    
+    def post(self, request, upload_id, *args, **kwargs):
+        try:
+            upload, documents = uploads.complete_upload(upload_id, request.data.get('sha256'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**upload.to_dict(), "pages": len(documents)}, status=status.HTTP_200_OK)
+
+
+class ProposalAnalysisView(APIView):
+    """
+    API endpoint for analyzing all files of a proposal together.
+    
+    Accepts several uploaded ``files`` (e.g. the title document and every stage
+    report), an optional ``proposal_id`` and ``custom_questions``. The files share
+    one index built from per-file artifacts cached by content hash, so
+    resubmitting with a new stage report only embeds the new file.
+    """
+    
+    def post(self, request, *args, **kwargs):
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        custom_questions = None
+        if 'custom_questions' in request.data:
+            try:
+                custom_questions = json.loads(request.data['custom_questions'])
+            except json.JSONDecodeError:
+                return Response(
+                    {"error": "Invalid format for custom_questions"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        proposal_id = (request.data.get('proposal_id') or '').strip() or None
+        
+        try:
+            hashes = [compute_file_hash(file) for file in files]
+            result, shared = analysis_flight.do(
+                f"proposal:{proposal_id}:" + analysis_key(proposal_hash(hashes), custom_questions),
+                run_proposal_analysis, files, custom_questions, proposal_id, hashes
+            )
+            if shared:
+                print("Joined in-flight proposal analysis for identical request")
+            return Response(result, status=status.HTTP_200_OK)
+        except ValueError as e:
+            logger.error(f"ValueError in proposal analysis: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Exception in proposal analysis: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            return Response(
+                {"error": f"Processing failed: {e}", "type": "system_error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class LLMMetricsView(APIView):
+    """
+    API endpoint exposing per-tier LLM latency and token usage for this process.
+    """
+    
+    def get(self, request, *args, **kwargs):
+        return Response(
+            {
+                "tiers": {tier: tier_config(tier) for tier in MODEL_TIERS},
+                "metrics": llm_metrics.snapshot()
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ProfileListView(APIView):
+    """
+    Admin API endpoint listing stored analysis profiles, newest first.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+        except ValueError:
+            return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": profiling.list_profiles(limit)}, status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    """
+    Admin API endpoint returning a profile's metadata, or one of its artifacts
+    (``collapsed``, ``svg``, ``prof``, ``txt``) when ``artifact`` is given.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, profile_id, artifact=None, *args, **kwargs):
+        if artifact is None:
+            metadata = profiling.get_profile(profile_id)
+            if metadata is None:
+                return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(metadata, status=status.HTTP_200_OK)
+        path = profiling.artifact_path(profile_id, artifact)
+        if path is None:
+            return Response({"error": "Artifact not found"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), content_type=profiling.ARTIFACTS[artifact], filename=path.name)
+
+
+class SimilarDocumentsView(APIView):
+    """
+    API endpoint for finding previously analyzed proposals similar to a document.
+    
+    POST with one of ``file`` (uploaded document), ``text`` or ``document_hash``
+    (an already indexed document). DELETE with ``document_hash`` removes a
+    document from the corpus (staff only). GET returns corpus statistics.
+    """
+    
+    def get_permissions(self):
+        if self.request.method == 'DELETE':
+            return [IsAdminUser()]
+        return super().get_permissions()
+    
+    def get(self, request, *args, **kwargs):
+        from .corpus import corpus_index
+        return Response(corpus_index.stats(), status=status.HTTP_200_OK)
+    
+    def post(self, request, *args, **kwargs):
+        from .corpus import corpus_index
+        from .models import CorpusChunk
+        import numpy as np
+        
+        try:
+            k = int(request.data.get('k', 5))
+        except (TypeError, ValueError):
+            k = 0
+        if not 1 <= k <= 100:
+            return Response({"error": "k must be an integer between 1 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            exclude_hash = None
+            if 'file' in request.FILES:
+                file = request.FILES['file']
+                exclude_hash = compute_file_hash(file)
+                vector_store = build_vector_store(load_document(file))
+                vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+            elif request.data.get('text'):
+                vectors = np.array([get_embeddings().embed_query(request.data['text'])], dtype="float32")
+            elif request.data.get('document_hash'):
+                exclude_hash = request.data['document_hash']
+                embeddings = CorpusChunk.objects.filter(document_hash=exclude_hash).values_list('embedding', flat=True)
+                if not embeddings:
+                    return Response({"error": "Document not found in corpus"}, status=status.HTTP_404_NOT_FOUND)
+                vectors = np.vstack([np.frombuffer(bytes(e), dtype="float32") for e in embeddings])
+            else:
+                return Response(
+                    {"error": "Provide a file, text or document_hash"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            similar = corpus_index.search(vectors, k=k, exclude_hash=exclude_hash)
+            return Response({"similar_documents": similar}, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Exception in similarity search: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            return Response(
+                {"error": f"Similarity search failed: {e}", "type": "system_error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    def delete(self, request, *args, **kwargs):
+        from .corpus import corpus_index
+        
+        document_hash = request.data.get('document_hash') or request.query_params.get('document_hash')
+        if not document_hash:
+            return Response({"error": "document_hash is required"}, status=status.HTTP_400_BAD_REQUEST)
+        removed = corpus_index.remove_document(document_hash)
+        return Response({"removed_chunks": removed}, status=status.HTTP_200_OK)
+
+
+class AnalysisListView(APIView):
+    """
+    API endpoint listing persisted analyses, newest first, with keyset pagination.
+    
+    Query parameters: ``status``, ``document_hash``, ``source`` (substring),
+    ``created_after``/``created_before`` (ISO 8601), ``limit`` (max 100) and
+    ``cursor`` (the ``next_cursor`` of the previous page).
+    """
+    
+    MAX_LIMIT = 100
+    
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        queryset = Analysis.objects.all()
+        
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'].upper())
+        if params.get('document_hash'):
+            queryset = queryset.filter(document_hash=params['document_hash'])
+        if params.get('source'):
+            queryset = queryset.filter(source__icontains=params['source'])
+        try:
+            for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+                if params.get(param):
+                    queryset = queryset.filter(**{lookup: datetime.fromisoformat(params[param])})
+            limit = max(1, min(int(params.get('limit', 20)), self.MAX_LIMIT))
+            if params.get('cursor'):
+                created_at, last_id = decode_cursor(params['cursor'])
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+                )
+        except ValueError:
+            return Response({"error": "Invalid filter or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        page = list(queryset.defer('answers', 'report', 'decision', 'error')[:limit + 1])
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return Response(
+            {
+                "results": [analysis.to_dict() for analysis in page[:limit]],
+                "next_cursor": next_cursor
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class AnalysisDetailView(APIView):
+    """
+    API endpoint returning a single persisted analysis with answers and report.
+    """
+    
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            analysis = Analysis.objects.get(pk=pk)
+        except Analysis.DoesNotExist:
+            return Response({"error": "Analysis not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(analysis.to_dict(detail=True), status=status.HTTP_200_OK)
+
+
+def encode_cursor(analysis):
+    raw = f"{analysis.created_at.isoformat()}|{analysis.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(last_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+class ChainProposalListView(APIView):
+    """
+    API endpoint listing proposals from the local chain event index.
+    
+    Query parameters: ``state`` (number or name), ``recipient``, ``limit`` (max 100)
+    and ``before`` (return proposals with a lower id, for paging).
+    """
+    
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        queryset = ChainProposal.objects.all()
+        
+        try:
+            if params.get('state'):
+                state = params['state']
+                if not state.isdigit():
+                    names = {name.lower(): value for value, name in ChainProposal.STATE_CHOICES}
+                    state = names[state.lower()]
+                queryset = queryset.filter(state=int(state))
+            if params.get('recipient'):
+                queryset = queryset.filter(recipient=params['recipient'].lower())
+            if params.get('before'):
+                queryset = queryset.filter(proposal_id__lt=int(params['before']))
+            limit = max(1, min(int(params.get('limit', 50)), 100))
+        except (KeyError, ValueError):
+            return Response({"error": "Invalid filter"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        proposals = list(queryset[:limit])
+        return Response(
+            {
+                "results": [proposal.to_dict() for proposal in proposals],
+                "indexed_block": ChainIndexerState.objects.values_list('last_block', flat=True).first()
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ChainProposalDetailView(APIView):
+    """
+    API endpoint returning an indexed proposal with its stages and votes.
+    """
+    
+    def get(self, request, proposal_id, *args, **kwargs):
+        try:
+            proposal = ChainProposal.objects.prefetch_related('stages', 'votes').get(proposal_id=proposal_id)
+        except ChainProposal.DoesNotExist:
+            return Response({"error": "Proposal not indexed"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            {
+                **proposal.to_dict(),
+                "stages": [stage.to_dict() for stage in proposal.stages.all()],
+                "votes": [vote.to_dict() for vote in proposal.votes.all()]
+            },
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,86 @@
+import logging
+import math
+import os
+import sys
+import threading
+
+from django.conf import settings
+from django.http import JsonResponse
+
+
+def current_rss_mb():
+    """Return the current (not peak) resident set size of this process in MB, or None."""
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as statm:
+                pages = int(statm.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class AdmissionControlMiddleware:
+    """
+    Caps the number of in-flight analysis requests per process.
+
+    Requests to the controlled paths wait up to ANALYSIS_QUEUE_TIMEOUT seconds for
+    a free slot; beyond that, or when RSS is above ANALYSIS_MAX_RSS_MB, they are
+    answered with 429 and a Retry-After header instead of starting another
+    embedding/index build.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, "ADMISSION_CONTROLLED_PATHS", ("/analyze/",)))
+        self.max_inflight = getattr(settings, "ANALYSIS_MAX_INFLIGHT", 2)
+        self.max_waiting = getattr(settings, "ANALYSIS_MAX_WAITING", 4)
+        self.queue_timeout = getattr(settings, "ANALYSIS_QUEUE_TIMEOUT", 10.0)
+        self.max_rss_mb = getattr(settings, "ANALYSIS_MAX_RSS_MB", None)
+        self.retry_after = getattr(settings, "ANALYSIS_RETRY_AFTER", 30)
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.lock = threading.Lock()
+        self.waiting = 0
+
+    def __call__(self, request):
+        if request.method != "POST" or not request.path.startswith(self.paths):
+            return self.get_response(request)
+
+        if self.max_rss_mb:
+            rss = current_rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                logging.warning(f"Rejecting {request.path}: RSS {rss:.2f} MB above limit {self.max_rss_mb} MB")
+                return self.reject("Server memory is under pressure")
+
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                if self.waiting >= self.max_waiting:
+                    logging.warning(f"Rejecting {request.path}: queue full ({self.waiting} waiting)")
+                    return self.reject("Too many analyses queued")
+                self.waiting += 1
+            try:
+                admitted = self.slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+            if not admitted:
+                logging.warning(f"Rejecting {request.path}: no analysis slot within {self.queue_timeout}s")
+                return self.reject("Too many analyses in progress")
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.slots.release()
+
+    def reject(self, reason):
+        response = JsonResponse(
+            {
+                "error": f"{reason}. Please retry later.",
+                "type": "overloaded",
+                "retry_after": self.retry_after,
+            },
+            status=429,
+        )
+        response["Retry-After"] = str(math.ceil(self.retry_after))
+        return response
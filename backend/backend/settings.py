@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'backend.memory_middleware.MemoryUsageMiddleware',
+    'backend.admission_middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,6 +68,14 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'backend.urls'
 
+# Admission control for expensive analysis endpoints (per process)
+ADMISSION_CONTROLLED_PATHS = ['/analyze/', '/proposals/analyze/']
+ANALYSIS_MAX_INFLIGHT = int(os.getenv('ANALYSIS_MAX_INFLIGHT', 2))
+ANALYSIS_MAX_WAITING = int(os.getenv('ANALYSIS_MAX_WAITING', 4))
+ANALYSIS_QUEUE_TIMEOUT = float(os.getenv('ANALYSIS_QUEUE_TIMEOUT', 10))
+ANALYSIS_MAX_RSS_MB = float(os.getenv('ANALYSIS_MAX_RSS_MB', 0)) or None
+ANALYSIS_RETRY_AFTER = int(os.getenv('ANALYSIS_RETRY_AFTER', 30))
+
 # CORS settings - adjust for production
 if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
@@ -116,6 +125,49 @@ else:
     }
 
 
+# Cross-proposal similarity corpus (FAISS index persisted next to the database)
+CORPUS_INDEX_DIR = Path(os.getenv('CORPUS_INDEX_DIR', BASE_DIR / 'corpus_index'))
+CORPUS_IVF_PQ_MIN_VECTORS = int(os.getenv('CORPUS_IVF_PQ_MIN_VECTORS', 100000))
+
+# Per-file chunk/embedding artifacts for multi-file analysis (/proposals/analyze/)
+ARTIFACT_CACHE_DIR = Path(os.getenv('ARTIFACT_CACHE_DIR', BASE_DIR / 'artifact_cache'))
+ARTIFACT_COMPRESSION = os.getenv('ARTIFACT_COMPRESSION', 'False') == 'True'  # zstd for texts and metadata
+
+# Near-duplicate detection at upload (MinHash LSH)
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv('DEDUP_SIMILARITY_THRESHOLD', 0.8))
+DEDUP_REUSE_THRESHOLD = float(os.getenv('DEDUP_REUSE_THRESHOLD', 0.9))
+DEDUP_SHORT_CIRCUIT = os.getenv('DEDUP_SHORT_CIRCUIT', 'False') == 'True'  # opt-in reuse of a near-duplicate's analysis
+
+# Local index of PublicFundManagement contract events (python manage.py index_chain)
+CHAIN_RPC_URL = os.getenv('CHAIN_RPC_URL', 'http://127.0.0.1:8545')
+CHAIN_CONTRACT_ADDRESS = os.getenv('CHAIN_CONTRACT_ADDRESS')  # defaults to smart-contracts/deployments.json
+CHAIN_START_BLOCK = int(os.getenv('CHAIN_START_BLOCK', 0))
+CHAIN_BATCH_SIZE = int(os.getenv('CHAIN_BATCH_SIZE', 2000))
+CHAIN_CONFIRMATIONS = int(os.getenv('CHAIN_CONFIRMATIONS', 0))
+
+# IPFS stage reports: fetcher ('gateway' or 'local' stand-in directory) and on-disk LRU cache
+IPFS_FETCHER = os.getenv('IPFS_FETCHER', 'gateway')
+IPFS_GATEWAY_URL = os.getenv('IPFS_GATEWAY_URL', 'https://gateway.pinata.cloud')
+IPFS_LOCAL_GATEWAY_DIR = Path(os.getenv('IPFS_LOCAL_GATEWAY_DIR', BASE_DIR / 'ipfs_local'))
+IPFS_CACHE_DIR = Path(os.getenv('IPFS_CACHE_DIR', BASE_DIR / 'ipfs_cache'))
+IPFS_CACHE_MAX_BYTES = int(os.getenv('IPFS_CACHE_MAX_MB', 512)) * 1024 * 1024
+IPFS_MAX_BYTES = int(os.getenv('IPFS_MAX_MB', 50)) * 1024 * 1024  # largest stage report fetched by CID
+
+# Chunked, resumable uploads (/uploads/)
+UPLOAD_DIR = Path(os.getenv('UPLOAD_DIR', BASE_DIR / 'uploads'))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE_MB', 5)) * 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_MB', 200)) * 1024 * 1024
+UPLOAD_EXPIRY_HOURS = int(os.getenv('UPLOAD_EXPIRY_HOURS', 24))
+
+# Per-request profiling of /analyze/ (X-Profile header for staff or with PROFILE_TOKEN;
+# PROFILE_ANALYSES=sample|cprofile profiles every analysis)
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', BASE_DIR / 'profiles'))
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_ANALYSES = os.getenv('PROFILE_ANALYSES', '')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000
+PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', 200))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
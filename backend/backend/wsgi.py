@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# With gunicorn's preload_app this runs once in the master, before workers fork
+if os.getenv('PRELOAD_MODELS', 'False') == 'True':
+    from APIs.utils import preload_models
+    preload_models()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark LLM providers side by side on the standard evaluation questions
+
+Usage:
+    python benchmark_llm_providers.py fake groq openai_compatible --concurrency 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from APIs.llm import get_llm
+from APIs.utils import STANDARD_QUESTIONS
+
+SAMPLE_FILE = os.path.join(current_dir, "..", "files", "proposal1", "title.txt")
+
+PROMPT = """
+You are a government funding reviewer analyzing documents to determine if projects should receive funding.
+Use the following context to answer the question. If you don't know the answer, say "Information not found in document" rather than making up information.
+
+Context: {context}
+
+Question: {question}
+
+Answer:
+"""
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def benchmark(provider, context, rounds, concurrency):
+    llm = get_llm(temperature=0, provider=provider)
+    prompts = [PROMPT.format(context=context, question=q) for q in STANDARD_QUESTIONS] * rounds
+
+    def timed(prompt):
+        start = time.perf_counter()
+        llm.invoke(prompt)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, prompts))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "calls": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("providers", nargs="+", help="groq, openai_compatible, llamacpp or fake")
+    parser.add_argument("--rounds", type=int, default=1, help="times to repeat the question set")
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(SAMPLE_FILE, encoding="utf-8") as f:
+        context = f.read()
+
+    print(f"{'provider':<20}{'calls':>8}{'calls/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for provider in args.providers:
+        try:
+            stats = benchmark(provider, context, args.rounds, args.concurrency)
+            print(f"{provider:<20}{stats['calls']:>8}{stats['throughput']:>10.2f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}")
+        except Exception as e:
+            print(f"{provider:<20} ❌ {str(e)[:100]}")
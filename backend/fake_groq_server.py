@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Groq chat completions API, for load testing
+
+Emulates Groq's response latency (log-normal time to first token plus
+generation time at a fixed token rate) and its per-minute request/token rate
+limits, answering 429 with retry-after like the real API.
+
+Usage:
+    python fake_groq_server.py --port 8089 --latency-ms 400 --rpm 30 --tpm 6000
+
+Then start Django with GROQ_API_BASE=http://127.0.0.1:8089 GROQ_API_KEY=fake
+(or LLM_PROVIDER=openai_compatible LLM_LOCAL_BASE_URL=http://127.0.0.1:8089/v1).
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens."""
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.events = deque()  # (timestamp, tokens)
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Record a request, or return the seconds to wait if it exceeds a limit."""
+        with self.lock:
+            now = time.monotonic()
+            while self.events and self.events[0][0] <= now - 60:
+                self.events.popleft()
+            used_tokens = sum(t for _, t in self.events)
+            if self.rpm and len(self.events) >= self.rpm:
+                return self.events[0][0] + 60 - now, "requests"
+            if self.tpm and used_tokens + tokens > self.tpm:
+                # Wait until enough earlier tokens leave the window
+                freed = 0
+                for timestamp, t in self.events:
+                    freed += t
+                    if used_tokens - freed + tokens <= self.tpm:
+                        return timestamp + 60 - now, "tokens"
+                return 60.0, "tokens"
+            self.events.append((now, tokens))
+            return None, None
+
+    def remaining(self):
+        with self.lock:
+            return (
+                max(0, self.rpm - len(self.events)) if self.rpm else None,
+                max(0, self.tpm - sum(t for _, t in self.events)) if self.tpm else None,
+            )
+
+
+def make_handler(config, limiter, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            if config.verbose:
+                super().log_message(format, *args)
+
+        def send_json(self, code, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with stats["lock"]:
+                    self.send_json(200, {k: v for k, v in stats.items() if k != "lock"})
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            if self.path not in ("/openai/v1/chat/completions", "/v1/chat/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+            prompt_tokens = max(1, len(prompt) // 4)
+            completion_tokens = max(1, min(
+                int(random.expovariate(1 / config.completion_tokens)) + 1,
+                payload.get("max_tokens") or 1 << 30,
+            ))
+
+            with stats["lock"]:
+                stats["requests"] += 1
+            retry_after, limit = limiter.acquire(prompt_tokens + completion_tokens)
+            if retry_after is not None:
+                with stats["lock"]:
+                    stats["rate_limited"] += 1
+                self.send_json(429, {
+                    "error": {
+                        "message": f"Rate limit reached on {limit} per minute. Please try again in {retry_after:.2f}s.",
+                        "type": limit,
+                        "code": "rate_limit_exceeded",
+                    }
+                }, {"retry-after": str(max(1, round(retry_after)))})
+                return
+            if random.random() < config.error_rate:
+                with stats["lock"]:
+                    stats["errors"] += 1
+                self.send_json(503, {"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+                return
+
+            time_to_first_token = random.lognormvariate(0, config.latency_sigma) * config.latency_ms / 1000
+            time.sleep(time_to_first_token + completion_tokens / config.tokens_per_second)
+
+            digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+            if "DECISION:" in prompt:
+                content = "DECISION: REVIEW\nREASONING: Load-test stand-in response."
+            else:
+                content = f"Stand-in answer (ref {digest})."
+            remaining_requests, remaining_tokens = limiter.remaining()
+            headers = {}
+            if remaining_requests is not None:
+                headers["x-ratelimit-remaining-requests"] = str(remaining_requests)
+            if remaining_tokens is not None:
+                headers["x-ratelimit-remaining-tokens"] = str(remaining_tokens)
+            with stats["lock"]:
+                stats["completed"] += 1
+            self.send_json(200, {
+                "id": f"chatcmpl-{digest}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }, headers)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=500, help="generation speed")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="mean completion length")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute limit (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per minute limit (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stats = {"lock": threading.Lock(), "requests": 0, "completed": 0, "rate_limited": 0, "errors": 0}
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, RateLimiter(args.rpm, args.tpm), stats))
+    print(f"Fake Groq server on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms:.0f}ms, rpm {args.rpm or '∞'}, tpm {args.tpm or '∞'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for the backend.
+
+Set PRELOAD_MODELS=True to load the embedding model in the master before
+workers fork, so every worker shares its weights copy-on-write instead of
+loading its own copy. Use measure_worker_memory.py to check the effect.
+
+Workers are threaded (gthread): the per-process admission queue and the
+coalescing of identical analyses only work when concurrent requests share
+a process.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = 'gthread'
+# Enough threads for the admitted and queued analyses (see ANALYSIS_MAX_INFLIGHT /
+# ANALYSIS_MAX_WAITING in settings) plus a couple for cheap endpoints
+threads = int(os.getenv(
+    'GUNICORN_THREADS',
+    int(os.getenv('ANALYSIS_MAX_INFLIGHT', 2)) + int(os.getenv('ANALYSIS_MAX_WAITING', 4)) + 2,
+))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+preload_app = os.getenv('PRELOAD_MODELS', 'False') == 'True'
+
+# Split the cores between workers unless set explicitly
+torch_threads = int(os.getenv('TORCH_THREADS_PER_WORKER', max(1, multiprocessing.cpu_count() // workers)))
+
+
+def post_fork(server, worker):
+    from APIs.utils import configure_torch_threads
+    configure_torch_threads(torch_threads)
+    server.log.info(f"Worker {worker.pid}: torch threads set to {torch_threads}")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Load test /analyze/ at several concurrency levels with the sample proposals
+
+Run the backend against fake_groq_server.py (see its docstring) so the numbers
+reflect our pipeline plus a controlled LLM latency/rate-limit profile, not
+Groq's shared capacity.
+
+Usage:
+    python load_test.py --concurrency 1,4,8 --requests 24
+    python load_test.py --concurrency 8 --requests 40 --fake-groq http://127.0.0.1:8089 --json results.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+
+import requests
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILES = os.path.join(current_dir, "..", "files", "*", "*")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def load_samples(pattern):
+    samples = []
+    for path in sorted(glob.glob(pattern)):
+        if path.lower().endswith((".txt", ".pdf", ".docx")):
+            with open(path, "rb") as f:
+                samples.append((os.path.basename(path), f.read()))
+    if not samples:
+        raise SystemExit(f"No sample documents match {pattern}")
+    return samples
+
+
+def fake_groq_stats(url):
+    if not url:
+        return None
+    try:
+        return requests.get(f"{url.rstrip('/')}/stats", timeout=5).json()
+    except requests.RequestException:
+        return None
+
+
+def run_config(url, samples, concurrency, total, force, timeout):
+    """Send ``total`` uploads with ``concurrency`` in flight.
+
+    With ``force`` each request also opts out of coalescing, so concurrent
+    uploads of the same sample each run a full analysis.
+    """
+    files = cycle(samples)
+    lock = threading.Lock()
+
+    def one(_):
+        with lock:
+            name, content = next(files)
+        start = time.perf_counter()
+        try:
+            response = requests.post(
+                url,
+                files={"file": (name, content)},
+                data={"force": "true", "coalesce": "false"} if force else {},
+                timeout=timeout,
+            )
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+        except requests.Timeout:
+            outcome = "timeout"
+        except requests.RequestException:
+            outcome = "connection_error"
+        return outcome, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    ok_latencies = [latency for outcome, latency in results if outcome == "ok"]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": outcomes["ok"],
+        "errors": {k: v for k, v in outcomes.items() if k != "ok"},
+        "error_rate": 1 - outcomes["ok"] / total,
+        "elapsed": elapsed,
+        "throughput": outcomes["ok"] / elapsed,
+        "p50": percentile(ok_latencies, 50) if ok_latencies else None,
+        "p95": percentile(ok_latencies, 95) if ok_latencies else None,
+        "p99": percentile(ok_latencies, 99) if ok_latencies else None,
+    }
+
+
+def fmt_seconds(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/analyze/")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrency level")
+    parser.add_argument("--files", default=SAMPLE_FILES, help="glob of documents to upload")
+    parser.add_argument("--no-force", action="store_true",
+                        help="allow near-duplicate reuse and coalescing of identical in-flight requests "
+                             "(measures the cached path)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--fake-groq", help="fake Groq server URL, to report upstream calls and 429s per level")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    samples = load_samples(args.files)
+    print(f"Loaded {len(samples)} sample documents; target {args.url}")
+
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        before = fake_groq_stats(args.fake_groq)
+        stats = run_config(args.url, samples, concurrency, args.requests, not args.no_force, args.timeout)
+        after = fake_groq_stats(args.fake_groq)
+        if before and after:
+            stats["upstream"] = {key: after[key] - before[key] for key in after}
+        results.append(stats)
+
+    print(f"\n{'conc':>5}{'reqs':>6}{'ok':>6}{'err %':>7}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}  errors")
+    for r in results:
+        errors = ", ".join(f"{k}={v}" for k, v in sorted(r["errors"].items())) or "-"
+        if "upstream" in r:
+            errors += f" | LLM calls={r['upstream']['requests']} 429s={r['upstream']['rate_limited']}"
+        print(f"{r['concurrency']:>5}{r['requests']:>6}{r['ok']:>6}{r['error_rate'] * 100:>7.1f}"
+              f"{r['throughput']:>8.2f}{fmt_seconds(r['p50']):>8}{fmt_seconds(r['p95']):>8}{fmt_seconds(r['p99']):>8}  {errors}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
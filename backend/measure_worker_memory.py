@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Report shared vs private memory of gunicorn workers (Linux only)
+
+Usage:
+    python measure_worker_memory.py <gunicorn master pid>
+"""
+
+import argparse
+import os
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_rollup(pid):
+    """Return memory fields in MB from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(":")
+            if key in FIELDS:
+                values[key] = int(parts[1]) / 1024
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def children(master_pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # ppid is the 4th field, after the parenthesised command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("master_pid", type=int)
+    args = parser.parse_args()
+
+    print(f"{'process':<16}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>12}{'private MB':>12}")
+    totals = {"rss": 0, "pss": 0, "private": 0}
+    for label, pid in [("master", args.master_pid)] + [(f"worker {pid}", pid) for pid in children(args.master_pid)]:
+        stats = read_rollup(pid)
+        for key in totals:
+            totals[key] += stats[key]
+        print(f"{label:<16}{stats['rss']:>10.1f}{stats['pss']:>10.1f}{stats['shared']:>12.1f}{stats['private']:>12.1f}")
+
+    print(f"\nSum of RSS: {totals['rss']:.1f} MB (counts shared pages once per process)")
+    print(f"Sum of PSS: {totals['pss']:.1f} MB (actual footprint of master + workers)")
+    print(f"Sum of private: {totals['private']:.1f} MB")